@@ -1,6 +1,7 @@
-from django.core.mail import send_mail
 from django.shortcuts import render
 
+from posts.tasks import queue_mail
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -19,10 +20,5 @@ def permission_denied(request, exception):
 
 
 def send_email(subject, text, sender, recipient):
-    send_mail(
-        subject,
-        text,
-        sender,  # Это поле "От кого"
-        [recipient],  # Это поле "Кому" (можно указать список адресов)
-        fail_silently=False,  # Сообщать об ошибках («молчать ли об ошибках?»)
-    )
+    """Ставит письмо в очередь: его отправит воркер run_workers."""
+    queue_mail(subject, text, sender, [recipient])
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Post, Group
+from .jobs import requeue
+from .models import DeadJob, Post, Group
+from .search import get_backend
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -22,6 +24,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тексту идет через поисковый индекс, а не LIKE."""
+        if not search_term:
+            return queryset, False
+        return get_backend().filter_queryset(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     """Админ-модель сообществ.
@@ -40,8 +48,31 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class DeadJobAdmin(admin.ModelAdmin):
+    """Админ-модель задач очереди, исчерпавших попытки.
+
+    Отсюда задачи можно вернуть в очередь после исправления причины."""
+
+    list_display = ('task',
+                    'attempts',
+                    'created',
+                    'failed')
+    list_filter = ('task',)
+    readonly_fields = ('task', 'payload', 'attempts', 'error', 'created',
+                       'failed')
+    actions = ('requeue',)
+
+    def requeue(self, request, queryset):
+        requeue(queryset)
+        self.message_user(request, 'Задачи возвращены в очередь.')
+    requeue.short_description = 'Вернуть в очередь'
+
+
 # В админ-зоне можно создавать посты.
 admin.site.register(Post, PostAdmin)
 
 # В админ-зоне можно создавать сообщества.
 admin.site.register(Group, GroupAdmin)
+
+# В админ-зоне видны задачи очереди, которые не удалось выполнить.
+admin.site.register(DeadJob, DeadJobAdmin)
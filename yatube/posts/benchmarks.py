@@ -0,0 +1,226 @@
+import re
+import statistics
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, RequestFactory
+from django.urls import URLResolver, get_resolver
+
+from .models import Group, Post, User
+
+# Модули URL, страницы которых замеряются.
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+# Пути, которые не замеряются: GET меняет данные или сессию,
+# либо параметры пути не заполнить.
+SKIP = {
+    'profile_follow': 'GET подписывает на автора',
+    'profile_unfollow': 'GET отписывает от автора',
+    'logout': 'GET завершает сессию',
+    '/reset/<uid64>/<token>': 'ссылка из письма, параметры не заполнить',
+}
+# Строка запроса для страниц, которые без нее пусты.
+QUERY = {
+    'search': 'q=город',
+}
+# Допуски по умолчанию: доля роста для времени и байт, число запросов.
+# Хвосты p95/p99 по нескольким десяткам замеров шумнее медианы.
+TOLERANCES = {
+    'latency': 0.2,
+    'tail': 0.5,
+    'queries': 0,
+    'bytes': 0.1,
+}
+# Рост времени меньше стольких миллисекунд считается шумом.
+LATENCY_SLACK_MS = 1.0
+LATENCY_METRICS = {
+    'p50_ms': 'latency',
+    'p95_ms': 'tail',
+    'p99_ms': 'tail',
+    'sql_ms': 'latency',
+}
+
+_PARAMETER = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def sample_params():
+    """Параметры путей из данных: самые нагруженные автор, группа и пост.
+
+    Замер на «звездах» показывает худший случай, а не пустые страницы
+    из длинного хвоста."""
+    author = User.objects.annotate(
+        posts_total=Count('posts')
+    ).order_by('-posts_total').first()
+    group = Group.objects.annotate(
+        posts_total=Count('posts')
+    ).order_by('-posts_total').first()
+    post = Post.objects.annotate(
+        comments_total=Count('comments')
+    ).filter(author=author).order_by('-comments_total').first()
+    if author is None or post is None:
+        return None
+    return {
+        'username': author.username,
+        'slug': group.slug if group else '',
+        'post_id': post.pk,
+    }
+
+
+def routes():
+    """Пары (имя, путь) всех страниц из URLCONFS.
+
+    Неименованные пути называются своим шаблоном. Модуль, подключенный
+    в корневых URL несколько раз, берется по первому подключению."""
+    seen = set()
+    for resolver in get_resolver().url_patterns:
+        if not isinstance(resolver, URLResolver):
+            continue
+        module = getattr(resolver.urlconf_module, '__name__', None)
+        if module not in URLCONFS or module in seen:
+            continue
+        seen.add(module)
+        prefix = str(resolver.pattern)
+        for pattern in resolver.url_patterns:
+            route = str(pattern.pattern)
+            yield pattern.name or route, prefix + route
+
+
+def cases(params):
+    """Страницы для замера: имя и адрес с подставленными параметрами."""
+    result = {}
+    for name, route in routes():
+        if name in SKIP:
+            continue
+        path = '/' + _PARAMETER.sub(
+            lambda match: str(params[match.group(1)]), route
+        )
+        if name in QUERY:
+            path += '?' + QUERY[name]
+        result[name] = path
+    return result
+
+
+def session_cookie(user):
+    """Cookie сессии вошедшего пользователя для запросов мимо Client."""
+    client = Client()
+    client.force_login(user)
+    return '; '.join(f'{key}={morsel.value}'
+                     for key, morsel in client.cookies.items())
+
+
+@contextmanager
+def record_queries():
+    """Считает запросы к базе и их суммарное время в секундах."""
+    stats = {'queries': 0, 'sql': 0.0}
+
+    def wrapper(execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats['sql'] += perf_counter() - start
+            stats['queries'] += 1
+
+    with connection.execute_wrapper(wrapper):
+        yield stats
+
+
+def request(handler, path, cookie=''):
+    """Проводит GET через WSGI-обработчик, как это делает сервер.
+
+    Возвращает статус, размер тела, время ответа и запросы к базе."""
+    environ = RequestFactory().get(path, HTTP_COOKIE=cookie).environ
+    status = []
+    with record_queries() as stats:
+        start = perf_counter()
+        response = handler(environ, lambda code, headers: status.append(code))
+        try:
+            size = sum(len(chunk) for chunk in response)
+        finally:
+            response.close()
+        elapsed = perf_counter() - start
+    return int(status[0].split()[0]), size, elapsed, stats
+
+
+def percentile(values, share):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100,
+                                method='inclusive')[share - 1]
+
+
+def measure(handler, path, cookie, iterations, warmup):
+    """Метрики одной страницы: перцентили времени, запросы, байты.
+
+    Первые warmup ответов прогревают кеши и не учитываются."""
+    for _ in range(warmup):
+        request(handler, path, cookie)
+    samples = [request(handler, path, cookie) for _ in range(iterations)]
+    latencies = [elapsed * 1e3 for _, _, elapsed, _ in samples]
+    return {
+        'path': path,
+        'status': samples[-1][0],
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': statistics.median_low(
+            [stats['queries'] for *_, stats in samples]
+        ),
+        'sql_ms': round(statistics.median(
+            [stats['sql'] * 1e3 for *_, stats in samples]
+        ), 3),
+        'bytes': statistics.median_low([size for _, size, _, _ in samples]),
+    }
+
+
+def run(viewers, iterations=50, warmup=5, only=None):
+    """Замеряет все страницы для каждого посетителя.
+
+    viewers — словарь {название: пользователь или None для анонима}.
+    Возвращает {'<посетитель> <страница>': метрики}."""
+    params = sample_params()
+    if params is None:
+        raise ValueError('В базе нет постов: сначала запустите seed_yatube.')
+    handler = WSGIHandler()
+    results = {}
+    for viewer, user in viewers.items():
+        cookie = session_cookie(user) if user else ''
+        for name, path in cases(params).items():
+            if only and not any(part in name for part in only):
+                continue
+            results[f'{viewer} {name}'] = measure(handler, path, cookie,
+                                                  iterations, warmup)
+    return results
+
+
+def compare(results, baseline, tolerances=None):
+    """Регрессии results относительно baseline: список строк.
+
+    Время и байты сравниваются в долях от базы, время — с запасом
+    LATENCY_SLACK_MS на шум, число запросов — в штуках, код ответа
+    должен совпасть. Страницы, которых нет в базе, регрессией
+    не считаются."""
+    tolerances = {**TOLERANCES, **(tolerances or {})}
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if current['status'] != base['status']:
+            regressions.append(
+                f"{case}: код {base['status']} -> {current['status']}"
+            )
+        limits = {
+            metric: max(base[metric] * (1 + tolerances[tolerance]),
+                        base[metric] + LATENCY_SLACK_MS)
+            for metric, tolerance in LATENCY_METRICS.items()
+        }
+        limits['queries'] = base['queries'] + tolerances['queries']
+        limits['bytes'] = base['bytes'] * (1 + tolerances['bytes'])
+        regressions.extend(
+            f'{case}: {metric} {base[metric]} -> {current[metric]}'
+            for metric, limit in limits.items() if current[metric] > limit
+        )
+    return regressions
@@ -0,0 +1,89 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+
+from .page_cache import PAGE_PARAMS, get_versions, last_changed
+
+
+def _scopes_key(view_name, args):
+    return ':'.join(['posts:scopes', view_name, *map(str, args)])
+
+
+def remember_scopes(view_name, scopes, *args):
+    """Запоминает области, от которых зависит страница view_name(*args).
+
+    По ним conditional_page отвечает на следующий запрос страницы,
+    не заглядывая в базу: например, id группы по ее slug."""
+    cache.set(_scopes_key(view_name, args), scopes, None)
+
+
+def viewer(request):
+    """Кто смотрит страницу: сессия и CSRF-токен из cookies.
+
+    Страница зависит от вошедшего пользователя, но request.user стоит
+    запроса к базе, поэтому вместо него берутся cookies как есть."""
+    cookies = [request.COOKIES.get(name, '') for name in
+               (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME)]
+    if not any(cookies):
+        return 'anon'
+    return hashlib.sha1(':'.join(cookies).encode()).hexdigest()
+
+
+def validators(request, view_name, scopes, args):
+    """ETag и Last-Modified страницы по версиям ее областей.
+
+    Last-Modified отдается только анонимам (его не различить по
+    посетителям) и только для изменений старше секунды: иначе правка
+    в ту же секунду не изменила бы заголовок."""
+    params = [request.GET.get(name, '') for name in PAGE_PARAMS]
+    who = viewer(request)
+    parts = [view_name, *args, *params, who, *get_versions(scopes)]
+    etag = hashlib.sha1(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    last_modified = None
+    if who == 'anon':
+        changed = last_changed(scopes)
+        if changed < time.time() - 1:
+            last_modified = int(changed)
+    return quote_etag(etag), last_modified
+
+
+def conditional_page(view_name, scopes=None):
+    """Отвечает 304 на GET страницы, которая не изменилась.
+
+    scopes — области страницы, если они известны заранее; иначе
+    берутся запомненные remember_scopes при прошлом показе. Ответ 304
+    собирается только из кеша, до запросов к базе и рендера шаблона."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            view_args = [*args, *kwargs.values()]
+            page_scopes = scopes or cache.get(_scopes_key(view_name,
+                                                          view_args))
+            etag = last_modified = response = None
+            if page_scopes:
+                etag, last_modified = validators(request, view_name,
+                                                 page_scopes, view_args)
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and etag:
+                    response.setdefault('ETag', etag)
+                    if last_modified:
+                        response.setdefault('Last-Modified',
+                                            http_date(last_modified))
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# Сколько записей сверяется за один проход reconcile.
+BATCH_SIZE: int = 1000
+
+
+def _add(queryset, **deltas):
+    queryset.update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def add_user_stats(user_id, **deltas):
+    """Сдвигает счетчики пользователя.
+
+    Строки нет только у пользователей, созданных в обход сигналов,
+    ее заводит reconcile_counters."""
+    if user_id is not None:
+        _add(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+def add_group_posts(group_id, delta):
+    """Сдвигает счетчик постов группы."""
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def add_post_comments(post_id, delta):
+    """Сдвигает счетчик комментариев поста."""
+    if post_id is not None:
+        _add(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def _actual_counts(pks, counters):
+    counts = {pk: dict.fromkeys(counters, 0) for pk in pks}
+    for field, (model, fk) in counters.items():
+        rows = model.objects.filter(**{fk + '__in': pks}).values_list(
+            fk
+        ).annotate(Count('pk')).order_by()
+        for pk, count in rows:
+            counts[pk][field] = count
+    return counts
+
+
+def _reconcile(owner, stats, counters, batch_size):
+    """Сверяет счетчики stats для всех записей owner пачками по pk.
+
+    counters — словарь {поле счетчика: (модель, внешний ключ)}.
+    Возвращает число исправленных строк."""
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            owner.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not pks:
+            return fixed
+        last_pk = pks[-1]
+        with transaction.atomic():
+            actual = _actual_counts(pks, counters)
+            stored = {
+                row.pop('pk'): row
+                for row in stats.objects.select_for_update().filter(
+                    pk__in=pks
+                ).values('pk', *counters)
+            }
+            missing = [
+                stats(pk=pk, **actual[pk]) for pk in pks if pk not in stored
+            ]
+            stats.objects.bulk_create(missing)
+            fixed += len(missing)
+            for pk, row in stored.items():
+                if row != actual[pk]:
+                    stats.objects.filter(pk=pk).update(**actual[pk])
+                    fixed += 1
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """Пересчитывает все счетчики и исправляет расхождения.
+
+    Возвращает словарь {модель: число исправленных строк}."""
+    return {
+        'users': _reconcile(User, UserStats, {
+            'posts_count': (Post, 'author'),
+            'followers_count': (Follow, 'author'),
+            'following_count': (Follow, 'user'),
+        }, batch_size),
+        'groups': _reconcile(Group, Group, {
+            'posts_count': (Post, 'group'),
+        }, batch_size),
+        'posts': _reconcile(Post, Post, {
+            'comments_count': (Comment, 'post'),
+        }, batch_size),
+    }
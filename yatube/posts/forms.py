@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Post, Comment
+from .uploads import normalize_image
 
 
 class PostForm(forms.ModelForm):
@@ -20,6 +22,13 @@ class PostForm(forms.ModelForm):
             'image': 'Прикрепите к посту изображение'
         }
 
+    def clean_image(self):
+        """Новая картинка проверяется и перекодируется перед сохранением."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Форма комментария: текст."""
@@ -0,0 +1,277 @@
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import (DatabaseError, OperationalError, close_old_connections,
+                       connection, transaction)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import workers
+from .models import DeadJob, Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд задача принадлежит забравшему ее воркеру. Задачи
+# упавшего воркера после этого срока забирают другие.
+LEASE_TIMEOUT: int = 300
+# Задержка перед повтором: BACKOFF_BASE * 2 ** (попытка - 1) секунд,
+# но не больше BACKOFF_MAX.
+BACKOFF_BASE: int = 10
+BACKOFF_MAX: int = 3600
+# Сколько раз выполняется задача, прежде чем попасть в DeadJob.
+MAX_ATTEMPTS: int = 5
+# Сколько секунд воркер ждет новых задач при пустой очереди.
+POLL_INTERVAL: float = 1.0
+
+_tasks = {}
+
+
+class Task:
+    """Обработчик задач очереди.
+
+    func принимает список payload: воркер отдает ему до batch_size
+    задач одного вида за раз. Обработчик задач с побочным эффектом,
+    который нельзя повторять (idempotent=False), — генератор: он отдает
+    управление после каждой выполненной задачи, и воркер сразу
+    удаляет ее из очереди."""
+
+    def __init__(self, name, func, batch_size, idempotent):
+        self.name = name
+        self.func = func
+        self.batch_size = batch_size
+        self.idempotent = idempotent
+
+    def run(self, payloads):
+        """Выполняет задачи целиком, не отмечая выполненные по одной."""
+        result = self.func(payloads)
+        if not self.idempotent:
+            for _ in result:
+                pass
+
+
+def task(name, batch_size=1, idempotent=True):
+    """Регистрирует обработчик задач name."""
+    def register(func):
+        _tasks[name] = Task(name, func, batch_size, idempotent)
+        return func
+    return register
+
+
+def run_inline():
+    """Выполнять ли задачи в процессе, который их поставил.
+
+    Только на базе SQLite в памяти, то есть в тестах: воркеры
+    run_workers ее не видят. Везде еще задачи выполняют воркеры."""
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    """Ставит задачу name в очередь.
+
+    Запись создается в текущей транзакции: воркер увидит задачу,
+    только если транзакция зафиксирована. payload должен сериализоваться
+    в JSON. В тестах (run_inline) задача без задержки сразу забирается
+    текущим процессом и выполняется после фиксации транзакции: ошибка
+    задачи не откатывает запись, которая ее поставила. Задачу
+    с задержкой всегда выполняет воркер в свой срок."""
+    if name not in _tasks:
+        raise ValueError(f'Неизвестная задача {name}')
+    now = timezone.now()
+    job = Job(
+        task=name,
+        payload=json.dumps(payload or {}),
+        run_at=now + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+    )
+    inline = not delay and run_inline()
+    if inline:
+        job.locked_by = worker_name()
+        job.locked_until = now + timedelta(seconds=LEASE_TIMEOUT)
+        job.attempts = 1
+    job.save()
+    if inline:
+        transaction.on_commit(lambda: run_batch([job]))
+    return job
+
+
+def retry_delay(attempts):
+    """Через сколько секунд повторить задачу после attempts попыток."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def _unlocked(now):
+    return Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+
+
+def claim(worker):
+    """Забирает пачку готовых задач одного вида для воркера worker.
+
+    Задачи захватываются одним UPDATE с подзапросом: на SQLite он
+    выполняется целиком под блокировкой записи, а на базах с SKIP LOCKED
+    подзапрос пропускает строки, которые забирает другой воркер."""
+    now = timezone.now()
+    due = Job.objects.filter(_unlocked(now), run_at__lte=now)
+    head = due.values_list('task', flat=True).first()
+    if head is None:
+        return []
+    size = _tasks[head].batch_size if head in _tasks else 1
+    lease = now + timedelta(seconds=LEASE_TIMEOUT)
+    with transaction.atomic():
+        batch = due.filter(task=head).values('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            batch = batch.select_for_update(skip_locked=True)
+        Job.objects.filter(_unlocked(now), pk__in=batch[:size]).update(
+            locked_by=worker,
+            locked_until=lease,
+            attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(locked_by=worker, locked_until=lease))
+
+
+def _bury(job, error):
+    logger.error('Задача %s #%s не выполнена: %s', job.task, job.pk, error)
+    with transaction.atomic():
+        DeadJob.objects.create(task=job.task, payload=job.payload,
+                               attempts=job.attempts, error=error,
+                               created=job.created)
+        job.delete()
+
+
+def _fail(job, error):
+    """Переносит упавшую задачу на потом или в DeadJob."""
+    if job.attempts >= job.max_attempts:
+        _bury(job, error)
+        return
+    logger.warning('Задача %s #%s упала, попытка %s', job.task, job.pk,
+                   job.attempts)
+    Job.objects.filter(pk=job.pk).update(
+        locked_by='',
+        locked_until=None,
+        last_error=error,
+        run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+    )
+
+
+def _run_each(task, jobs):
+    """Выполняет пачку задач, удаляя каждую сразу после выполнения.
+
+    Упавшая задача откладывается, а следующие за ней выполняются
+    по одной: выполненные до ошибки задачи не повторяются."""
+    done = 0
+    try:
+        for _ in task.func([json.loads(job.payload) for job in jobs]):
+            Job.objects.filter(pk=jobs[done].pk).delete()
+            done += 1
+    except Exception:
+        _fail(jobs[done], traceback.format_exc())
+        for job in jobs[done + 1:]:
+            run_batch([job])
+
+
+def run_batch(jobs):
+    """Выполняет пачку задач одного вида.
+
+    Если пачка идемпотентных задач упала, задачи выполняются по одной,
+    чтобы ошибка одной задачи не откладывала остальные. Задачи, которые
+    нельзя повторять, выполняет _run_each."""
+    task = _tasks.get(jobs[0].task)
+    if task is None:
+        for job in jobs:
+            _bury(job, f'Неизвестная задача {job.task}')
+        return
+    if not task.idempotent:
+        _run_each(task, jobs)
+        return
+    try:
+        task.func([json.loads(job.payload) for job in jobs])
+    except Exception:
+        if len(jobs) == 1:
+            _fail(jobs[0], traceback.format_exc())
+            return
+        for job in jobs:
+            run_batch([job])
+        return
+    Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(once=False, poll_interval=POLL_INTERVAL, stop=None):
+    """Цикл воркера: забирает и выполняет задачи, пока не задан stop.
+
+    С once=True выходит, когда готовых задач не осталось.
+    Возвращает число выполненных попыток."""
+    worker = worker_name()
+    done = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            jobs = claim(worker)
+            if jobs:
+                run_batch(jobs)
+                done += len(jobs)
+                continue
+        except OperationalError:
+            # SQLite занята другим воркером: задачи заберем позже.
+            logger.warning('База занята, воркер %s ждет', worker)
+        except DatabaseError:
+            logger.exception('Воркер %s не смог забрать задачи', worker)
+        if once:
+            break
+        if stop is None:
+            time.sleep(poll_interval)
+        else:
+            stop.wait(poll_interval)
+    return done
+
+
+def serve(stop, once, poll_interval):
+    """Цикл воркера в процессе, запущенном run_workers."""
+    # Ctrl+C получает вся группа процессов: воркер доделывает пачку
+    # и выходит по stop, который ставит run_workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    work(once, poll_interval, stop)
+
+
+def run_workers(count, once=False, poll_interval=POLL_INTERVAL):
+    """Запускает count процессов-воркеров и ждет их завершения.
+
+    Процессы запускаются через spawn, как пул миниатюр. SIGINT и SIGTERM
+    останавливают воркеров после текущей пачки."""
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    processes = [
+        context.Process(target=workers.run_jobs,
+                        args=(stop, once, poll_interval))
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for process in processes:
+            process.join()
+
+
+def requeue(dead_jobs):
+    """Возвращает задачи из DeadJob в очередь с новым счетчиком попыток."""
+    dead_jobs = list(dead_jobs)
+    with transaction.atomic():
+        Job.objects.bulk_create(
+            Job(task=dead.task, payload=dead.payload) for dead in dead_jobs
+        )
+        DeadJob.objects.filter(pk__in=[dead.pk for dead in dead_jobs]).delete()
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+def acquire(key, timeout):
+    """Занимает блокировку key на timeout секунд.
+
+    Возвращает False, если ее держит другой процесс. Просроченную
+    блокировку (процесс упал, не сняв ее) забирает один UPDATE: из
+    нескольких забирающих его условие выполнится только у первого."""
+    # Модели импортируются здесь: posts.thumbnails, который берет
+    # блокировки, загружается в процессах пула до django.setup().
+    from .models import Lock
+
+    now = timezone.now()
+    expires = now + timedelta(seconds=timeout)
+    if Lock.objects.filter(key=key, expires__lt=now).update(expires=expires):
+        return True
+    try:
+        with transaction.atomic():
+            Lock.objects.create(key=key, expires=expires)
+    except IntegrityError:
+        return False
+    return True
+
+
+def release(key):
+    """Снимает блокировку key."""
+    from .models import Lock
+
+    Lock.objects.filter(key=key).delete()
@@ -0,0 +1,84 @@
+import tempfile
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import notifications
+from posts.models import Follow, Post, make_excerpt
+
+User = get_user_model()
+
+BACKENDS = {
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает рассылку уведомлений по одному письму send_mail '
+            'и дайджестами через общее соединение: писем в секунду. Данные '
+            'создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', type=int, default=1000,
+            help='Сколько подписчиков у автора.'
+        )
+        parser.add_argument(
+            '--backend', choices=sorted(BACKENDS), default='file',
+            help='Почтовый бэкенд для замера.'
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as path, \
+                override_settings(EMAIL_BACKEND=BACKENDS[options['backend']],
+                                  EMAIL_FILE_PATH=path), \
+                transaction.atomic():
+            post = self.seed(options['followers'])
+            notifications.collect([post.pk])
+            self.report('send_mail', self.one_by_one, post)
+            self.report('digests', notifications.send_digests)
+            transaction.set_rollback(True)
+
+    def report(self, name, send, *args):
+        start = perf_counter()
+        sent = send(*args)
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            f'{name:>14}: {sent} писем за {elapsed:.2f} с, '
+            f'{sent / elapsed:8.0f} писем/с'
+        )
+
+    def one_by_one(self, post):
+        """Рассылка без пачек: письмо и соединение на подписчика."""
+        sent = 0
+        for follow in Follow.objects.filter(
+            author=post.author
+        ).select_related('user'):
+            subject, body = notifications.digest([post])
+            sent += send_mail(subject, body, settings.DEFAULT_FROM_EMAIL,
+                              [follow.user.email])
+        return sent
+
+    def seed(self, count):
+        author = User.objects.create_user(username='bench_notifications')
+        User.objects.bulk_create(
+            (User(username=f'bench_follower_{i}',
+                  email=f'follower{i}@yatube.ru') for i in range(count)),
+            batch_size=500
+        )
+        followers = User.objects.filter(
+            username__startswith='bench_follower_'
+        )
+        Follow.objects.bulk_create(
+            (Follow(user=user, author=author) for user in followers),
+            batch_size=500
+        )
+        text = 'Тестовый пост'
+        return Post.objects.create(author=author, text=text,
+                                   excerpt=make_excerpt(text))
@@ -0,0 +1,38 @@
+from timeit import repeat
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+
+from posts.views import LIMIT
+
+
+class Command(BaseCommand):
+    help = ('Замеряет рендер пажинатора при растущем числе страниц: '
+            'время не должно зависеть от числа страниц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, nargs='+',
+            default=[10, 1000, 100000, 1000000],
+            help='Числа страниц, на которых мерить рендер.'
+        )
+        parser.add_argument(
+            '--number', type=int, default=200,
+            help='Сколько рендеров в одном замере.'
+        )
+
+    def handle(self, *args, **options):
+        template = get_template('posts/includes/paginator.html')
+        number = options['number']
+        for num_pages in options['pages']:
+            # range дает длину без запроса к базе: меряется только шаблон.
+            paginator = Paginator(range(num_pages * LIMIT), LIMIT)
+            context = {'page_obj': paginator.page(num_pages // 2 or 1)}
+            best = min(repeat(lambda: template.render(context),
+                              number=number, repeat=3))
+            size = len(template.render(context))
+            self.stdout.write(
+                f'{num_pages:>9} страниц: '
+                f'{best / number * 1e6:8.1f} мкс на рендер, {size} байт'
+            )
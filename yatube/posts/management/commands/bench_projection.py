@@ -0,0 +1,73 @@
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Group, Post, make_excerpt
+from posts.views import LIMIT
+
+User = get_user_model()
+
+
+def fetched_bytes(queryset):
+    """Сколько байт значений отдает SQLite на запрос queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return sum(
+            len(str(value).encode()) for row in cursor.fetchall()
+            for value in row if value is not None
+        )
+
+
+def peak_memory(queryset):
+    """Пик памяти Python при чтении страницы в модели."""
+    tracemalloc.start()
+    try:
+        list(queryset)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение страницы ленты целиком и по полям карточки: '
+            'байты из SQLite и память Python. Данные создаются в '
+            'транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=1000,
+            help='Сколько постов с длинными текстами создать.'
+        )
+        parser.add_argument(
+            '--text-length', type=int, default=20000,
+            help='Длина текста каждого поста в символах.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['posts'], options['text_length'])
+            pages = {
+                'все поля': Post.objects.select_related('author', 'group'),
+                'карточка': Post.objects.cards(),
+            }
+            for name, queryset in pages.items():
+                page = queryset.order_by('-pub_date', '-pk')[:LIMIT]
+                self.stdout.write(
+                    f'{name:>10}: {fetched_bytes(page):>9} байт из базы, '
+                    f'{peak_memory(page):>9} байт памяти на страницу'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count, text_length):
+        author = User.objects.create_user(username='bench_projection')
+        group = Group.objects.create(title='bench', slug='bench-projection',
+                                     description='bench')
+        text = ('Длинный пост ' * text_length)[:text_length]
+        Post.objects.bulk_create(
+            (Post(author=author, group=group, text=text,
+                  excerpt=make_excerpt(text)) for _ in range(count)),
+            batch_size=500
+        )
@@ -0,0 +1,76 @@
+import tracemalloc
+from timeit import repeat
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import get_template
+
+from posts.models import Group, Post, make_excerpt
+from posts.views import LIMIT
+
+User = get_user_model()
+
+
+def allocations(queryset):
+    """Сколько блоков памяти и байт остается под прочитанной страницей."""
+    tracemalloc.start()
+    try:
+        page = list(queryset)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del page
+    stats = snapshot.statistics('filename')
+    return sum(stat.count for stat in stats), sum(stat.size for stat in stats)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает страницу ленты из моделей Post и из строк PostRow: '
+            'число аллокаций и время чтения с рендером карточек. Данные '
+            'создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=1000,
+            help='Сколько постов создать.'
+        )
+        parser.add_argument(
+            '--number', type=int, default=50,
+            help='Сколько страниц читать в одном замере времени.'
+        )
+
+    def handle(self, *args, **options):
+        card = get_template('includes/card.html')
+        number = options['number']
+        with transaction.atomic():
+            self.seed(options['posts'])
+            pages = {
+                'models': Post.objects.cards(),
+                'rows': Post.objects.cards().rows(),
+            }
+            for name, queryset in pages.items():
+                page = queryset.order_by('-pub_date', '-pk')[:LIMIT]
+                blocks, size = allocations(page)
+
+                def render():
+                    for post in page.all():
+                        card.render({'post': post})
+
+                best = min(repeat(render, number=number, repeat=3))
+                self.stdout.write(
+                    f'{name:>6}: {blocks:>6} блоков, {size:>7} байт, '
+                    f'{best / number * 1e3:6.2f} мс на страницу'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        author = User.objects.create_user(username='bench_read_model')
+        group = Group.objects.create(title='bench', slug='bench-read-model',
+                                     description='bench')
+        text = 'Тестовый пост'
+        Post.objects.bulk_create(
+            (Post(author=author, group=group, text=text,
+                  excerpt=make_excerpt(text)) for _ in range(count)),
+            batch_size=500
+        )
@@ -0,0 +1,105 @@
+import json
+import os
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from posts import benchmarks, seed
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Замеряет каждую страницу posts, users и about через '
+            'WSGI-обработчик на базе seed_yatube: p50/p95/p99 времени, '
+            'запросы, время SQL и байты ответа. Пишет JSON и сравнивает '
+            'его с сохраненной базой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=os.path.join(settings.BASE_DIR,
+                                               'seed.sqlite3'),
+            help='Файл SQLite, заполненный seed_yatube.'
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Сколько первых ответов не учитывать.'
+        )
+        parser.add_argument(
+            '--only', action='append',
+            help='Замерять только страницы, в имени которых есть подстрока '
+                 '(можно указать несколько раз).'
+        )
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON.'
+        )
+        parser.add_argument(
+            '--baseline', help='JSON прошлого замера для сравнения.'
+        )
+        for metric, default in benchmarks.TOLERANCES.items():
+            parser.add_argument(
+                f'--{metric}-tolerance', type=float, default=default,
+                dest=metric,
+                help=f'Допустимый рост {metric} (по умолчанию {default}).'
+            )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['database'])
+        if not os.path.exists(path):
+            raise CommandError(f'{path} не найден, запустите seed_yatube.')
+        seed.use_database(path)
+        # Вошедший посетитель — тот, у кого больше всего подписок.
+        viewers = {
+            'anon': None,
+            'user': User.objects.annotate(
+                following_total=Count('follower')
+            ).order_by('-following_total').first(),
+        }
+        try:
+            results = benchmarks.run(viewers, options['iterations'],
+                                     options['warmup'], options['only'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'meta': self.meta(path, options),
+                           'results': results}, file,
+                          ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options)
+
+    def meta(self, path, options):
+        return {
+            'database': path,
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"страница":<32}{"код":>4}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"SQL":>5}{"SQL мс":>9}{"байт":>9}'
+        )
+        for case, metrics in results.items():
+            self.stdout.write(
+                f'{case:<32}{metrics["status"]:>4}'
+                f'{metrics["p50_ms"]:>9.2f}{metrics["p95_ms"]:>9.2f}'
+                f'{metrics["p99_ms"]:>9.2f}{metrics["queries"]:>5}'
+                f'{metrics["sql_ms"]:>9.2f}{metrics["bytes"]:>9}'
+            )
+
+    def compare(self, results, options):
+        with open(options['baseline']) as file:
+            baseline = json.load(file)['results']
+        regressions = benchmarks.compare(results, baseline, {
+            metric: options[metric] for metric in benchmarks.TOLERANCES
+        })
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import storage
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов из каталога posts/ в хранилище '
+            'по содержимому (BlobStorage).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=storage.BATCH_SIZE,
+            help='Сколько постов переносить за один проход.'
+        )
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Не удалять исходные файлы после переноса.'
+        )
+
+    def handle(self, *args, **options):
+        moved, missing = storage.migrate_images(options['batch_size'],
+                                                options['keep_old'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено картинок: {moved}'))
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f'Файлы не найдены: {missing}')
+            )
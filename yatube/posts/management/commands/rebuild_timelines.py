@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из Post и Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, чью ленту нужно пересобрать '
+                 '(можно указать несколько раз).'
+        )
+
+    def handle(self, *args, **options):
+        processed = timeline.rebuild(options['user_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано подписок: {processed}')
+        )
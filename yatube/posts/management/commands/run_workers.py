@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import jobs
+
+
+class Command(BaseCommand):
+    help = ('Запускает воркеров фоновой очереди: письма, раскладка лент '
+            'и другие задачи posts.jobs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.POSTS_JOB_WORKERS or 1,
+            help='Сколько процессов-воркеров запустить.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=jobs.POLL_INTERVAL,
+            help='Сколько секунд ждать новых задач при пустой очереди.'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            done = jobs.work(options['once'], options['poll_interval'])
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+            return
+        jobs.run_workers(options['workers'], options['once'],
+                         options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Воркеры остановлены'))
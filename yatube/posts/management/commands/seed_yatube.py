@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import counters, search, seed, timeline, workers
+
+
+class Command(BaseCommand):
+    help = ('Заполняет отдельный файл SQLite реалистичными данными: '
+            'степенное распределение подписчиков, всплески постов, '
+            'длинный хвост групп. Данные определяются --seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=os.path.join(settings.BASE_DIR,
+                                               'seed.sqlite3'),
+            help='Файл SQLite, который будет создан и заполнен.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перезаписать файл базы, если он уже есть.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--comments', type=int, default=20_000)
+        parser.add_argument(
+            '--follows', type=int, default=10_000,
+            help='Примерное число подписок.'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Сколько процессов генерируют и пишут данные.'
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счетчики, поисковый индекс и ленты.'
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['database'])
+        if options['users'] < 2 or options['posts'] < 1:
+            raise CommandError('Нужны хотя бы 2 пользователя и 1 пост.')
+        self.prepare(path, options['force'])
+        plan = seed.make_plan(options['seed'], **{
+            table: options[table] for table in seed.TABLES
+        })
+        if options['processes'] > 1:
+            with multiprocessing.get_context('spawn').Pool(
+                options['processes'], initializer=workers.init_seed,
+                initargs=(path,)
+            ) as pool:
+                self.fill(plan, pool.imap_unordered)
+        else:
+            self.fill(plan, map)
+        if not options['skip_derived']:
+            self.derive()
+        connections['default'].close()
+
+    def prepare(self, path, force):
+        """Создает пустой файл базы и применяет миграции."""
+        if os.path.exists(path):
+            if not force:
+                raise CommandError(f'{path} уже существует, см. --force.')
+            os.remove(path)
+        seed.use_database(path)
+        call_command('migrate', verbosity=0)
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = WAL')
+
+    def fill(self, plan, map_tasks):
+        for table in seed.TABLES:
+            start = perf_counter()
+            written = sum(
+                count for _, count in map_tasks(seed.write_chunk,
+                                                seed.tasks(plan, table))
+            )
+            elapsed = perf_counter() - start
+            self.stdout.write(
+                f'{table:>8}: {written} строк за {elapsed:.1f} с, '
+                f'{written / elapsed:8.0f} строк/с'
+            )
+
+    def derive(self):
+        """Счетчики, поиск и ленты, которые bulk_create не обновил."""
+        steps = {
+            'счетчики': counters.reconcile,
+            'поисковый индекс': search.get_backend().rebuild,
+            'ленты подписок': timeline.rebuild,
+        }
+        for name, step in steps.items():
+            start = perf_counter()
+            step()
+            self.stdout.write(
+                f'Пересчитаны {name} за {perf_counter() - start:.1f} с'
+            )
@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:24
+
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Как posts.timeline.BACKFILL_LIMIT и BATCH_SIZE на момент миграции.
+BACKFILL_LIMIT = 500
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает в ленты подписчиков последние посты авторов:
+    без этого /follow/ после миграции пуста до rebuild_timelines."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    pairs = Follow.objects.exclude(user=None).exclude(author=None).values_list(
+        'author_id', 'user_id'
+    ).distinct().order_by('author_id')
+    for author_id, group in groupby(list(pairs), key=itemgetter(0)):
+        followers = [user_id for _, user_id in group]
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', 'pub_date')[:BACKFILL_LIMIT])
+        entries = (
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          pub_date=pub_date)
+            for user_id in followers for post_id, pub_date in posts
+        )
+        while True:
+            batch = list(islice(entries, BATCH_SIZE))
+            if not batch:
+                break
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-pub_date', '-pk'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_post_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
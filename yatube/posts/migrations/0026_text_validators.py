@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:30
+
+from django.db import migrations, models
+import posts.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_userstats_timeline_pulled'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('-pub_date',)},
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(validators=[posts.validators.validate_not_empty]),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='text',
+            field=models.TextField(validators=[posts.validators.validate_not_empty]),
+        ),
+    ]
@@ -1,12 +1,52 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.text import Truncator
 
+from .read_models import ROW_FIELDS, PostRowIterable
+from .storage import BlobStorage, blob_image_field
 from .validators import validate_not_empty
 
 User = get_user_model()
 
+# Сколько символов текста поста показывается в ленте.
+EXCERPT_LENGTH: int = 300
 
-class Group(models.Model):
+
+def make_excerpt(text):
+    """Начало текста поста для карточки в ленте."""
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
+
+class CountedModel(models.Model):
+    """Модель, связанная со счетчиками.
+
+    Сохранение идет в транзакции, чтобы сигналы обновили счетчики
+    вместе с самой записью. Поля из counter_fields меняются только
+    через F-выражения, поэтому save() существующей записи их не пишет."""
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (self.counter_fields and not self._state.adding
+                and kwargs.get('update_fields') is None):
+            # Отложенные поля (only/defer) не загружены: как и обычный
+            # save(), их не пишем, иначе Django дочитает их по одному.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class Group(CountedModel):
     """Модель сообществ.
 
     У сообществ есть название, адрес, описание и пользователь-создатель."""
@@ -19,13 +59,29 @@ class Group(models.Model):
         null=True,
         on_delete=models.CASCADE
     )
+    posts_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('posts_count',)
 
     def __str__(self):
         """Дает название на страницах сообществ."""
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+
+    def cards(self):
+        """Посты только с полями, которые нужны карточке в ленте."""
+        return self.select_related('author', 'group').only(*Post.card_fields)
+
+    def rows(self):
+        """Посты строками PostRow вместо моделей: для рендера лент."""
+        clone = self.values_list(*ROW_FIELDS)
+        clone._iterable_class = PostRowIterable
+        return clone
+
+
+class Post(CountedModel):
     """Модель постов.
 
     У постов есть текст, картинка, дата публикации, сообщество,
@@ -46,23 +102,59 @@ class Post(models.Model):
         on_delete=models.CASCADE,
         related_name='posts'
     )
-    image = models.ImageField(
+    image = blob_image_field(
         'Картинка',
         upload_to='posts/',
+        storage=BlobStorage(),
         blank=True
     )
+    # Меняется и при переименовании группы или автора:
+    # по нему строится ключ закешированной карточки поста.
+    modified = models.DateTimeField(auto_now=True)
+    comments_count = models.IntegerField(default=0, editable=False)
+    # Начало текста: ленты не читают длинные тексты целиком.
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True,
+                               editable=False)
+
+    counter_fields = ('comments_count',)
+    # Поля, которые читаются для карточки поста (includes/card.html).
+    card_fields = ('pub_date', 'image', 'excerpt', 'modified',
+                   'author', 'author__username', 'group', 'group__slug')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы под ленты: главная, группа и профиль листаются
+        # по (pub_date, id) от новых постов к старым.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         """Вывод текста поста."""
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if 'text' not in self.get_deferred_fields():
+            # Без загруженного текста он не меняется, как и начало.
+            self.excerpt = make_excerpt(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            # modified — ключ закешированной карточки: он меняется
+            # вместе с текстом, как и при полном save().
+            kwargs['update_fields'] = {*update_fields, 'excerpt', 'modified'}
+        super().save(*args, **kwargs)
+
 
-class Comment(models.Model):
+class Comment(CountedModel):
     """Модель комментариев.
 
     У комментариев есть текст, пост, к которому относится
@@ -85,13 +177,17 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['post', '-pub_date', '-id'],
+                         name='comment_post_pub_date_idx'),
+        ]
 
     def __str__(self):
         """Вывод текста комментария."""
         return self.text
 
 
-class Follow(models.Model):
+class Follow(CountedModel):
     """Модель подписок: автор контента и подписчик."""
 
     user = models.ForeignKey(
@@ -106,3 +202,199 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя: посты, подписчики и подписки.
+
+    Обновляются вместе с Post и Follow, поэтому страницы читают их
+    без агрегирующих запросов."""
+
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    # Посты автора не разложены по лентам подписчиков: он был популярным
+    # (posts.timeline). Снимается, когда посты разложены снова.
+    timeline_pulled = models.BooleanField(default=False)
+
+    def __str__(self):
+        """Вывод пользователя."""
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок.
+
+    Строка на каждую пару (подписчик, пост автора, на которого он подписан).
+    Заполняется при публикации поста и при подписке, поэтому страница
+    /follow/ читается одним диапазоном по индексу (user, -pub_date, -post)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date, чтобы сортировать ленту без join.
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-pk')
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_post_idx'),
+        ]
+
+    def __str__(self):
+        """Вывод подписчика и поста."""
+        return f'{self.user_id}: {self.post_id}'
+
+
+class ImageVariant(models.Model):
+    """Вариант картинки поста определенной ширины и формата.
+
+    Создаются после сохранения поста (posts.variants) и выводятся
+    тегом picture как <source srcset> для браузеров с поддержкой формата."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='variants'
+    )
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    file = models.ImageField(upload_to='posts/variants/')
+
+    class Meta:
+        ordering = ('format', 'width')
+        unique_together = ('post', 'format', 'width')
+
+    def __str__(self):
+        """Вывод поста, формата и ширины."""
+        return f'{self.post_id}: {self.format} {self.width}w'
+
+
+class Blob(models.Model):
+    """Файл хранилища BlobStorage и число ссылок на него."""
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """Вывод имени файла и числа ссылок."""
+        return f'{self.name}: {self.refs}'
+
+
+class Job(models.Model):
+    """Задача фоновой очереди (posts.jobs).
+
+    Воркер забирает задачу, ставя locked_by и срок аренды locked_until.
+    Выполненная задача удаляется, упавшая переносится на run_at с
+    нарастающей задержкой, а после max_attempts попыток — в DeadJob."""
+
+    task = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('run_at', 'pk')
+        indexes = [
+            models.Index(fields=['run_at', 'id'], name='job_run_at_idx'),
+        ]
+
+    def __str__(self):
+        """Вывод задачи и номера попытки."""
+        return f'{self.task} #{self.pk}: {self.attempts}'
+
+
+class DeadJob(models.Model):
+    """Задача, которая исчерпала попытки, с последней ошибкой."""
+
+    task = models.CharField(max_length=100)
+    payload = models.TextField()
+    attempts = models.PositiveIntegerField()
+    error = models.TextField()
+    created = models.DateTimeField()
+    failed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-failed',)
+
+    def __str__(self):
+        """Вывод задачи и времени последней попытки."""
+        return f'{self.task}: {self.failed:%Y-%m-%d %H:%M}'
+
+
+class Notification(models.Model):
+    """Уведомление подписчика о новом посте автора.
+
+    Создается при публикации поста, а отправляется письмом-дайджестом
+    (posts.notifications). sent — время отправки; пока его нет,
+    уведомление ждет дайджеста, поэтому повторный запуск не шлет
+    письмо второй раз. claimed_until — срок, до которого уведомление
+    отправляет забравшая его рассылка; после него уведомление упавшей
+    рассылки забирает следующая."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['sent', 'user'],
+                         name='notification_sent_user_idx'),
+        ]
+
+    def __str__(self):
+        """Вывод подписчика и поста."""
+        return f'{self.user_id}: {self.post_id}'
+
+
+class Lock(models.Model):
+    """Блокировка между процессами и серверами (posts.locks).
+
+    Строка на занятый ключ; после expires блокировку упавшего процесса
+    забирает другой."""
+
+    key = models.CharField(max_length=255, unique=True)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        """Вывод ключа и срока блокировки."""
+        return f'{self.key}: {self.expires:%Y-%m-%d %H:%M:%S}'
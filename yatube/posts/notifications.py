@@ -0,0 +1,145 @@
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Follow, Notification, Post
+
+# Скольким подписчикам письма уходят через одно соединение.
+BATCH_SIZE: int = 100
+# Сколько секунд уведомления принадлежат забравшей их рассылке.
+# Уведомления упавшей рассылки после этого срока забирает следующая.
+CLAIM_TIMEOUT: int = 300
+# Сколько строк уведомлений вставляется за один INSERT.
+INSERT_BATCH_SIZE: int = 1000
+
+
+def _bulk_insert(notifications):
+    notifications = iter(notifications)
+    while True:
+        batch = list(islice(notifications, INSERT_BATCH_SIZE))
+        if not batch:
+            return
+        Notification.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def collect(post_ids):
+    """Заводит уведомления подписчиков о постах post_ids.
+
+    Подписчики без адреса почты пропускаются, а повторный вызов
+    не создает дублей."""
+    posts = Post.objects.filter(pk__in=post_ids).values_list('pk',
+                                                             'author_id')
+    for post_id, author_id in posts:
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).exclude(user__email='').values_list('user_id', flat=True)
+        _bulk_insert(
+            Notification(user_id=user_id, post_id=post_id)
+            for user_id in followers.distinct().iterator()
+        )
+
+
+def _pending(now):
+    """Уведомления, которые ждут отправки и никем не забраны."""
+    return Notification.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+        sent__isnull=True,
+    )
+
+
+def _claim(user_ids):
+    """Забирает ожидающие уведомления подписчиков user_ids.
+
+    Срок аренды отличает пачку от пачек других рассылок: вернутся
+    только уведомления, забранные этим вызовом. sent не ставится,
+    пока письмо не ушло, поэтому упавшая рассылка ничего не теряет."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=CLAIM_TIMEOUT)
+    _pending(now).filter(user_id__in=user_ids).update(claimed_until=lease)
+    return list(
+        Notification.objects.filter(user_id__in=user_ids, sent__isnull=True,
+                                    claimed_until=lease)
+        .select_related('user', 'post__author')
+        .order_by('user_id', 'post__pub_date')
+    )
+
+
+def digest(posts):
+    """Тема и текст письма о новых постах posts.
+
+    Текст не зависит от получателя, поэтому рендерится один раз
+    на набор постов, а не на каждого подписчика."""
+    if len(posts) == 1:
+        subject = f'Новый пост автора {posts[0].author.username}'
+    else:
+        subject = f'Новые посты в ваших подписках: {len(posts)}'
+    body = render_to_string('posts/email/digest.txt', {
+        'posts': posts,
+        'site_url': settings.POSTS_SITE_URL,
+    })
+    return subject, body
+
+
+def _messages(claimed, rendered):
+    """Письма пачки: по одному на подписчика вместе с его уведомлениями."""
+    for user, group in groupby(claimed, key=lambda n: n.user):
+        group = list(group)
+        posts = [notification.post for notification in group]
+        key = tuple(post.pk for post in posts)
+        if key not in rendered:
+            rendered[key] = digest(posts)
+        subject, body = rendered[key]
+        message = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL,
+                               [user.email])
+        yield message, [notification.pk for notification in group]
+
+
+def _send(connection, claimed, rendered):
+    """Отправляет письма пачки, отмечая каждое сразу после отправки.
+
+    Если письмо не ушло, уведомления его и оставшихся подписчиков
+    пачки освобождаются и снова ждут отправки, а уже отправленные
+    остаются отмеченными и второй раз не уходят."""
+    sent = 0
+    left = {notification.pk for notification in claimed}
+    try:
+        for message, pks in _messages(claimed, rendered):
+            sent += connection.send_messages([message])
+            Notification.objects.filter(pk__in=pks).update(
+                sent=timezone.now(), claimed_until=None
+            )
+            left.difference_update(pks)
+    except Exception:
+        Notification.objects.filter(pk__in=left).update(claimed_until=None)
+        raise
+    return sent
+
+
+def send_digests(batch_size=BATCH_SIZE):
+    """Отправляет каждому подписчику одно письмо обо всех его новых постах.
+
+    Письма пачки из batch_size подписчиков уходят через одно
+    соединение с почтовым сервером. Возвращает число отправленных
+    писем."""
+    connection = get_connection(fail_silently=False)
+    rendered = {}
+    sent = 0
+    while True:
+        user_ids = list(
+            _pending(timezone.now())
+            .order_by('user_id').values_list('user_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not user_ids:
+            return sent
+        claimed = _claim(user_ids)
+        connection.open()
+        try:
+            sent += _send(connection, claimed, rendered)
+        finally:
+            connection.close()
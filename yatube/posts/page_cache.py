@@ -0,0 +1,97 @@
+import time
+
+from django.core.cache import cache
+
+# Сколько секунд живет закешированная страница ленты.
+PAGE_CACHE_TIMEOUT: int = 300
+
+# Параметры запроса, от которых зависит содержимое страницы ленты.
+PAGE_PARAMS = ('page', 'after', 'before')
+
+GLOBAL_SCOPE = 'global'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _version_key(scope):
+    return f'posts:version:{scope}'
+
+
+def _changed_key(scope):
+    return f'posts:changed:{scope}'
+
+
+def get_versions(scopes):
+    """Текущие версии областей.
+
+    Пропавшая из кеша версия заводится заново от текущего времени,
+    чтобы не совпасть ни с одной из выданных раньше."""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Увеличивает версии областей: их закешированные страницы устаревают.
+
+    Заодно запоминает время изменения для заголовка Last-Modified."""
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            get_versions([scope])
+    now = time.time()
+    cache.set_many({_changed_key(scope): now for scope in scopes}, None)
+
+
+def last_changed(scopes):
+    """Время последнего изменения областей (unix time).
+
+    Если время пропало из кеша, область считается измененной сейчас."""
+    keys = [_changed_key(scope) for scope in scopes]
+    changed = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in changed:
+            cache.add(key, now, None)
+            changed[key] = cache.get(key, now)
+    return max(changed.values())
+
+
+def count_cache_key(scope):
+    """Ключ закешированного числа постов в области."""
+    return f'posts:count:{scope}'
+
+
+def page_cache_key(request, view_name, scopes, *args):
+    """Ключ страницы ленты.
+
+    Учитывает представление, его аргументы, курсор страницы, версии
+    областей и то, авторизован ли посетитель."""
+    params = [request.GET.get(name, '') for name in PAGE_PARAMS]
+    auth = 'auth' if request.user.is_authenticated else 'anon'
+    parts = [view_name, *args, *params, auth, *get_versions(scopes)]
+    return ':'.join(str(part) for part in parts)
+
+
+# Сколько секунд живет закешированная карточка поста.
+CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+
+def card_cache_key(post):
+    """Ключ карточки поста: id и отметка последнего изменения."""
+    return f'posts:card:{post.pk}:{post.modified.timestamp()}'
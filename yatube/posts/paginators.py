@@ -0,0 +1,202 @@
+import heapq
+import json
+from itertools import islice
+from operator import attrgetter
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Сколько первых страниц доступно по старым ссылкам вида ?page=N.
+OFFSET_PAGES_LIMIT: int = 5
+
+# До скольких записей оценку из кеша дешевле заменить точным COUNT(*).
+EXACT_COUNT_LIMIT: int = 1000
+# Сколько секунд живет закешированная оценка числа записей.
+COUNT_CACHE_TIMEOUT: int = 600
+
+
+def encode_token(values):
+    """Кодирует список значений ключа в непрозрачный токен для URL."""
+    return urlsafe_base64_encode(force_bytes(json.dumps(values)))
+
+
+def decode_token(token):
+    """Раскодирует токен в список значений ключа.
+
+    Для пустого или испорченного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        values = json.loads(urlsafe_base64_decode(token).decode())
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+def encode_cursor(obj, pk_field='pk'):
+    """Кодирует ключ (pub_date, id) записи в непрозрачный токен."""
+    return encode_token([obj.pub_date.isoformat(), getattr(obj, pk_field)])
+
+
+def decode_cursor(token):
+    """Раскодирует токен в ключ (pub_date, id).
+
+    Для пустого или испорченного токена возвращает None."""
+    try:
+        pub_date, pk = decode_token(token)
+        pub_date = parse_datetime(pub_date)
+    except (TypeError, ValueError):
+        return None
+    if pub_date is None or not isinstance(pk, int):
+        return None
+    return pub_date, pk
+
+
+def keyset(queryset, key=None, newer=False, pk_field='pk'):
+    """Упорядочивает queryset по (pub_date, pk_field) и отсекает по ключу.
+
+    По умолчанию записи идут от новых к старым и начинаются сразу после
+    key; с newer=True — от старых к новым и сразу перед key."""
+    if newer:
+        ordering = ('pub_date', pk_field)
+        lookup = 'gt'
+    else:
+        ordering = ('-pub_date', '-' + pk_field)
+        lookup = 'lt'
+    if key is not None:
+        pub_date, pk = key
+        queryset = queryset.filter(
+            Q(**{'pub_date__' + lookup: pub_date})
+            | Q(pub_date=pub_date, **{pk_field + '__' + lookup: pk})
+        )
+    return queryset.order_by(*ordering)
+
+
+class CountingPaginator(Paginator):
+    """Пажинатор, который не считает COUNT(*) на каждой странице.
+
+    total — значение поддерживаемого счетчика (Group.posts_count,
+    UserStats.posts_count). Без него число записей берется из кеша по
+    count_key и обновляется раз в COUNT_CACHE_TIMEOUT секунд; такое
+    число — оценка, и is_estimate становится True. Небольшие выборки
+    все равно считаются точно: отставший счетчик (посты из bulk_create)
+    не должен прятать страницы."""
+
+    is_estimate = False
+
+    def __init__(self, object_list, per_page, total=None, count_key=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.total = total
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.total is not None and self.total >= EXACT_COUNT_LIMIT:
+            return self.total
+        if self.count_key is None:
+            return super().count
+        cached = cache.get(self.count_key)
+        if cached is None or cached < EXACT_COUNT_LIMIT:
+            count = super().count
+            cache.set(self.count_key, count, COUNT_CACHE_TIMEOUT)
+            return count
+        self.is_estimate = True
+        return cached
+
+
+class CursorPaginator(Paginator):
+    """Пажинатор по ключу (pub_date, id).
+
+    Не выполняет ни COUNT(*), ни OFFSET: каждая страница читается
+    одним запросом от ключа крайней показанной записи. Номера страниц
+    условные, их хватает для has_next/has_previous, а ссылки строятся
+    по токенам next_cursor и previous_cursor."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, pk_field='pk', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.pk_field = pk_field
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.num_pages = 1
+
+    def get_cursor_page(self, params):
+        """Страница по параметрам запроса: ?after=, ?before= или ?page=."""
+        after = decode_cursor(params.get('after'))
+        if after is not None:
+            return self._page_after(after)
+        before = decode_cursor(params.get('before'))
+        if before is not None:
+            return self._page_before(before)
+        return self._page_number(params.get('page'))
+
+    def _fetch(self, key, newer, limit, offset=0):
+        """Читает limit записей от ключа key, пропустив первые offset."""
+        queryset = keyset(self.object_list, key, newer, self.pk_field)
+        return list(queryset[offset:offset + limit])
+
+    def _page_after(self, key):
+        rows = self._fetch(key, False, self.per_page + 1)
+        if not rows:
+            return self._page_number(1)
+        return self._build_page(rows, 2, len(rows) > self.per_page)
+
+    def _page_before(self, key):
+        rows = self._fetch(key, True, self.per_page + 1)
+        if not rows:
+            return self._page_number(1)
+        number = 2 if len(rows) > self.per_page else 1
+        return self._build_page(rows[:self.per_page][::-1], number, True)
+
+    def _page_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if not 1 <= number <= OFFSET_PAGES_LIMIT:
+            number = 1
+        rows = self._fetch(None, False, self.per_page + 1,
+                           offset=(number - 1) * self.per_page)
+        if not rows and number > 1:
+            return self._page_number(1)
+        return self._build_page(rows, number, len(rows) > self.per_page)
+
+    def _build_page(self, rows, number, has_next):
+        rows = rows[:self.per_page]
+        if has_next:
+            self.next_cursor = encode_cursor(rows[-1], self.pk_field)
+        if number > 1:
+            self.previous_cursor = encode_cursor(rows[0], self.pk_field)
+        self.num_pages = number + 1 if has_next else number
+        return self._get_page(rows, number, self)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорный пажинатор по нескольким лентам постов сразу.
+
+    sources — список пар (queryset, post_field): post_field — имя внешнего
+    ключа на Post либо None, если queryset сам отдает посты. Из каждой
+    ленты читается не больше страницы от общего ключа (pub_date, id поста),
+    а результаты сливаются k-way слиянием."""
+
+    def _fetch(self, key, newer, limit, offset=0):
+        runs = []
+        for queryset, post_field in self.object_list:
+            pk_field = post_field + '_id' if post_field else 'pk'
+            rows = keyset(queryset, key, newer, pk_field)[:offset + limit]
+            if post_field:
+                rows = map(attrgetter(post_field), rows)
+            runs.append(rows)
+        merged = heapq.merge(
+            *runs,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not newer
+        )
+        return list(islice(merged, offset, offset + limit))
@@ -0,0 +1,163 @@
+import json
+import logging
+import random
+import threading
+from functools import wraps
+from importlib import import_module
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Фазы запроса в порядке вывода в Server-Timing.
+PHASES = ('db', 'session', 'template', 'thumbnail')
+
+_local = threading.local()
+
+
+class Profile:
+    """Время фаз одного запроса в секундах."""
+
+    __slots__ = ('totals', 'depth', 'queries')
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.depth = dict.fromkeys(PHASES, 0)
+        self.queries = 0
+
+
+def timed(phase, func):
+    """Обертка, которая добавляет время вызова func к фазе запроса.
+
+    Вне профилируемого запроса и во вложенных вызовах той же фазы
+    (include шаблона, get_thumbnail внутри get_thumbnail) время
+    не считается: иначе оно учлось бы дважды."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = getattr(_local, 'profile', None)
+        if profile is None or profile.depth[phase]:
+            return func(*args, **kwargs)
+        profile.depth[phase] += 1
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.totals[phase] += perf_counter() - start
+            profile.depth[phase] -= 1
+    wrapper.profiled = True
+    return wrapper
+
+
+def _patch(owner, name, phase):
+    func = getattr(owner, name)
+    if not getattr(func, 'profiled', False):
+        setattr(owner, name, timed(phase, func))
+
+
+def install():
+    """Ставит замеры на рендер шаблонов, загрузку сессии и sorl.
+
+    Вызывается один раз, когда включается ProfilingMiddleware:
+    без нее код Django и sorl остается нетронутым."""
+    from django.template.base import Template
+    from sorl.thumbnail.conf import settings as sorl_settings
+    from sorl.thumbnail.helpers import get_module_class
+
+    from . import thumbnails
+
+    _patch(Template, 'render', 'template')
+    _patch(import_module(settings.SESSION_ENGINE).SessionStore, 'load',
+           'session')
+    _patch(get_module_class(sorl_settings.THUMBNAIL_BACKEND),
+           'get_thumbnail', 'thumbnail')
+    kvstore = get_module_class(sorl_settings.THUMBNAIL_KVSTORE)
+    for name in ('get', 'set', 'delete'):
+        _patch(kvstore, name, 'thumbnail')
+    _patch(thumbnails, '_get_many', 'thumbnail')
+
+
+def _execute(execute, sql, params, many, context):
+    profile = _local.profile
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.totals['db'] += perf_counter() - start
+        profile.queries += 1
+
+
+def server_timing(profile, total):
+    """Значение заголовка Server-Timing: фазы и общее время в мс."""
+    parts = [f'db;dur={profile.totals["db"] * 1e3:.2f};'
+             f'desc="{profile.queries} queries"']
+    parts.extend(f'{phase};dur={profile.totals[phase] * 1e3:.2f}'
+                 for phase in PHASES[1:] if profile.totals[phase])
+    parts.append(f'total;dur={total * 1e3:.2f}')
+    return ', '.join(parts)
+
+
+class ProfilingMiddleware:
+    """Замеряет фазы запроса: SQL, сессию, шаблоны и миниатюры.
+
+    Включается POSTS_PROFILING; без него Django убирает middleware
+    из цепочки при запуске, и запросы не платят за замеры ничего.
+    Фазы замеряются только у доли запросов POSTS_PROFILING_SAMPLE_RATE
+    и у запросов с адресов INTERNAL_IPS: остальные идут мимо оберток
+    и платят лишь за общий таймер. Выбранные запросы пишутся в лог
+    posts.profiling, а запросы с INTERNAL_IPS еще и получают заголовок
+    Server-Timing: посторонним он не показывается. Запросы медленнее
+    POSTS_PROFILING_SLOW_MS пишутся в лог всегда, без выборки —
+    с фазами, только если они замерялись."""
+
+    def __init__(self, get_response):
+        if not settings.POSTS_PROFILING:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.sample_rate = settings.POSTS_PROFILING_SAMPLE_RATE
+        self.slow = settings.POSTS_PROFILING_SLOW_MS / 1e3
+        self.internal_ips = frozenset(settings.INTERNAL_IPS)
+
+    def __call__(self, request):
+        internal = request.META.get('REMOTE_ADDR') in self.internal_ips
+        sampled = random.random() < self.sample_rate
+        if not (internal or sampled):
+            start = perf_counter()
+            response = self.get_response(request)
+            total = perf_counter() - start
+            if total >= self.slow:
+                self.log(request, response, None, total)
+            return response
+        profile = _local.profile = Profile()
+        start = perf_counter()
+        try:
+            with connection.execute_wrapper(_execute):
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = perf_counter() - start
+        if internal:
+            response['Server-Timing'] = server_timing(profile, total)
+        if sampled or total >= self.slow:
+            self.log(request, response, profile, total)
+        return response
+
+    def log(self, request, response, profile, total):
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1e3, 2),
+        }
+        if profile is not None:
+            record['queries'] = profile.queries
+            record.update(
+                (f'{phase}_ms', round(profile.totals[phase] * 1e3, 2))
+                for phase in PHASES
+            )
+        logger.info(json.dumps(record, ensure_ascii=False))
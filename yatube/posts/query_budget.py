@@ -0,0 +1,98 @@
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+# Сколько запросов к базе может сделать GET страницы с холодным кешем
+# для вошедшего пользователя, по имени URL. Два запроса — сессия
+# и пользователь, еще один — миниатюры картинок на странице, а в лентах
+# еще один — COUNT(*) пажинатора номеров страниц (POSTS_PAGINATION).
+# Бюджет не зависит от размера страницы: число постов и комментариев
+# на ней не должно менять число запросов.
+BUDGETS = {
+    'posts:posts_list': 6,
+    'posts:group_list': 7,
+    'posts:profile': 8,
+    'posts:post_detail': 6,
+    'posts:post_comments': 2,
+    'posts:follow_index': 7,
+    'posts:search': 6,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'about:author': 2,
+    'about:tech': 2,
+    'users:signup': 2,
+    'users:login': 2,
+}
+# Сколько кадров стека показывать у запроса.
+ORIGIN_DEPTH: int = 3
+# Кадры, которые замеряют запросы, а не делают их.
+_OWN_FILES = ('query_budget.py', 'test_runner.py', 'profiling.py')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Страница сделала больше запросов, чем разрешает ее бюджет."""
+
+
+def _origin(frame):
+    """Строки кода проекта и шаблонов, из которых пришел запрос.
+
+    Кадры Django и библиотек пропускаются; для узла шаблона
+    показываются имя шаблона и строка тега."""
+    origin = []
+    while frame is not None and len(origin) < ORIGIN_DEPTH:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            template = getattr(getattr(node, 'origin', None),
+                               'template_name', None)
+            if token is not None and template:
+                origin.append(f'{template}:{token.lineno} '
+                              f'«{token.contents[:60]}»')
+        elif code.co_filename.startswith(settings.BASE_DIR) and \
+                not code.co_filename.endswith(_OWN_FILES):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            origin.append(f'{path}:{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return tuple(origin)
+
+
+@contextmanager
+def record():
+    """Пишет запросы к базе: список пар (SQL, откуда вызван)."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append((sql, _origin(sys._getframe(1))))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def report(queries):
+    """Запросы, сгруппированные по тексту SQL: повторы — признак N+1."""
+    counts = Counter(sql for sql, _ in queries)
+    origins = {}
+    for sql, origin in queries:
+        origins.setdefault(sql, origin)
+    lines = []
+    for sql, count in counts.most_common():
+        lines.append(f'  {count}× {sql}')
+        lines.extend(f'      {line}' for line in origins[sql])
+    return '\n'.join(lines)
+
+
+def check(view_name, path, queries):
+    """Бросает QueryBudgetExceeded, если страница вышла из бюджета."""
+    budget = BUDGETS.get(view_name)
+    if budget is None or len(queries) <= budget:
+        return
+    raise QueryBudgetExceeded(
+        f'{view_name} ({path}): {len(queries)} запросов при бюджете '
+        f'{budget}\n{report(queries)}'
+    )
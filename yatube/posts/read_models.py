@@ -0,0 +1,73 @@
+from django.db.models.query import ValuesListIterable
+
+# Поля строки ленты в порядке, в котором их читает PostRowIterable.
+ROW_FIELDS = ('id', 'pub_date', 'image', 'excerpt', 'modified',
+              'author_id', 'author__username', 'group_id', 'group__slug')
+
+
+class AuthorRow:
+    """Автор поста в ленте: в шаблонах выводится как username."""
+
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def __str__(self):
+        return self.username
+
+
+class GroupRow:
+    """Сообщество поста в ленте: для ссылки хватает slug."""
+
+    __slots__ = ('id', 'slug')
+
+    def __init__(self, id, slug):
+        self.id = id
+        self.slug = slug
+
+
+class PostRow:
+    """Пост в ленте без модели Django.
+
+    Несет только то, что читают карточка, ключ ее кеша и пажинаторы.
+    image — имя файла в хранилище, его понимает тег thumbnail;
+    thumbnail заполняет thumbnails.prefetch_thumbnails."""
+
+    __slots__ = ('id', 'pub_date', 'image', 'excerpt', 'modified',
+                 'author', 'group', 'thumbnail')
+
+    def __init__(self, id, pub_date, image, excerpt, modified, author,
+                 group):
+        self.id = id
+        self.pub_date = pub_date
+        self.image = image
+        self.excerpt = excerpt
+        self.modified = modified
+        self.author = author
+        self.group = group
+        self.thumbnail = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        return isinstance(other, PostRow) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class PostRowIterable(ValuesListIterable):
+    """Итерирует queryset.values_list(*ROW_FIELDS) строками PostRow."""
+
+    def __iter__(self):
+        for (pk, pub_date, image, excerpt, modified, author_id, username,
+             group_id, slug) in super().__iter__():
+            yield PostRow(
+                pk, pub_date, image, excerpt, modified,
+                AuthorRow(author_id, username),
+                GroupRow(group_id, slug) if group_id is not None else None,
+            )
@@ -0,0 +1,228 @@
+import logging
+import re
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginators import decode_token, encode_token
+
+logger = logging.getLogger(__name__)
+
+# Сколько постов индексируется за один проход rebuild.
+BATCH_SIZE: int = 1000
+
+
+class SearchBackend:
+    """Интерфейс поискового движка по текстам постов.
+
+    Движок хранит свой индекс, Post остается источником истины:
+    сигналы передают в index/remove изменения, а rebuild пересобирает
+    индекс целиком."""
+
+    def index(self, posts):
+        """Добавляет или обновляет посты из пар (id, text)."""
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        """Убирает посты из индекса."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Очищает индекс."""
+        raise NotImplementedError
+
+    def search(self, query, after=None, limit=10):
+        """Пары (id поста, score) по убыванию релевантности.
+
+        after — пара (score, id), после которой продолжить выдачу."""
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query):
+        """Оставляет в queryset постов только найденные."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=BATCH_SIZE):
+        """Пересобирает индекс, читая посты пачками по id.
+
+        Возвращает число проиндексированных постов."""
+        self.clear()
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'text'
+                )[:batch_size]
+            )
+            if not batch:
+                return indexed
+            self.index(batch)
+            indexed += len(batch)
+            last_pk = batch[-1][0]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Поиск по виртуальной таблице FTS5 с ранжированием bm25.
+
+    rowid таблицы совпадает с id поста."""
+
+    table = 'posts_post_fts'
+
+    def __init__(self):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured(
+                'SQLiteFTSBackend работает только с SQLite.'
+            )
+
+    @staticmethod
+    def match_expression(query):
+        """Запрос FTS5 из слов запроса: все слова должны встретиться."""
+        return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+    def index(self, posts):
+        posts = list(posts)
+        self.remove(post_id for post_id, text in posts)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                posts
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(post_id,) for post_id in post_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, query, after=None, limit=10):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        sql = (f'SELECT rowid, bm25({self.table}) AS score '
+               f'FROM {self.table} WHERE {self.table} MATCH %s')
+        params = [match]
+        if after is not None:
+            score, pk = after
+            sql += (f' AND (bm25({self.table}) > %s'
+                    f' OR (bm25({self.table}) = %s AND rowid > %s))')
+            params += [score, score, pk]
+        sql += ' ORDER BY score, rowid LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def filter_queryset(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match]
+        ))
+
+
+class ContainsBackend(SearchBackend):
+    """Поиск без индекса: подстроки слов запроса в тексте поста.
+
+    Работает на любой базе, но читает таблицу постов целиком. Выдача
+    идет от новых постов к старым: score — id поста со знаком минус."""
+
+    @staticmethod
+    def words(query):
+        return re.findall(r'\w+', query)
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def rebuild(self, batch_size=BATCH_SIZE):
+        return 0
+
+    def search(self, query, after=None, limit=10):
+        posts = self.filter_queryset(Post.objects.all(), query)
+        if after is not None:
+            posts = posts.filter(pk__lt=after[1])
+        return [(pk, -pk) for pk in
+                posts.order_by('-pk').values_list('pk', flat=True)[:limit]]
+
+    def filter_queryset(self, queryset, query):
+        words = self.words(query)
+        if not words:
+            return queryset.none()
+        return queryset.filter(
+            reduce(and_, (Q(text__icontains=word) for word in words))
+        )
+
+
+def get_backend():
+    """Поисковый движок из настройки POSTS_SEARCH_BACKEND.
+
+    Если движок не работает с текущей базой (SQLiteFTSBackend вне
+    SQLite), используется ContainsBackend: сохранение и удаление постов
+    не должны падать из-за поиска."""
+    try:
+        return import_string(settings.POSTS_SEARCH_BACKEND)()
+    except ImproperlyConfigured as error:
+        logger.warning('Поиск без индекса: %s', error)
+        return ContainsBackend()
+
+
+def decode_search_cursor(token):
+    """Раскодирует токен выдачи в пару (score, id)."""
+    try:
+        score, pk = decode_token(token)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(score, (int, float)) or not isinstance(pk, int):
+        return None
+    return score, pk
+
+
+class SearchPaginator(Paginator):
+    """Курсорный пажинатор выдачи поиска по ключу (score, id)."""
+
+    is_cursor = True
+
+    def __init__(self, query, per_page, backend=None, **kwargs):
+        super().__init__([], per_page, **kwargs)
+        self.query = query
+        self.backend = backend or get_backend()
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.num_pages = 1
+
+    def get_cursor_page(self, params):
+        """Страница выдачи от токена ?after= или первая страница."""
+        after = decode_search_cursor(params.get('after'))
+        hits = self.backend.search(self.query, after, self.per_page + 1)
+        has_next = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        posts = Post.objects.cards().in_bulk(
+            [pk for pk, score in hits]
+        )
+        if has_next:
+            pk, score = hits[-1]
+            self.next_cursor = encode_token([score, pk])
+        number = 1 if after is None else 2
+        self.num_pages = number + 1 if has_next else number
+        rows = [posts[pk] for pk, score in hits if pk in posts]
+        return self._get_page(rows, number, self)
@@ -0,0 +1,256 @@
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from .models import Comment, Follow, Group, Post, User, make_excerpt
+
+# Сколько строк создает одна задача: единица работы процесса.
+CHUNK_SIZE: int = 10_000
+# Сколько строк вставляется за один INSERT.
+BATCH_SIZE: int = 1000
+# Посты распределены по DAYS дням начиная со START.
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+DAYS: int = 3 * 365
+# Всплески публикаций внутри отрезка времени одной задачи.
+BURSTS: int = 20
+BURST_SECONDS: int = 6 * 3600
+# Доля постов без группы.
+NO_GROUP_SHARE: float = 0.3
+# Больше стольких авторов пользователь не читает.
+FOLLOWING_CAP: int = 1000
+# Пароль всех созданных пользователей.
+PASSWORD = 'yatube'
+
+WORDS = (
+    'лев', 'толстой', 'писал', 'роман', 'долго', 'утро', 'вечер', 'город',
+    'дорога', 'письмо', 'друг', 'книга', 'море', 'лес', 'поле', 'дом',
+    'окно', 'чай', 'снег', 'дождь', 'солнце', 'ветер', 'река', 'мост',
+    'поезд', 'станция', 'музыка', 'песня', 'история', 'память', 'время',
+    'работа', 'отпуск', 'кот', 'собака', 'сад', 'яблоко', 'хлеб', 'сосед',
+    'праздник', 'новость', 'вопрос', 'ответ', 'идея', 'план', 'мечта',
+    'путешествие', 'фотография', 'кино', 'театр', 'выставка', 'прогулка',
+    'сегодня', 'вчера', 'завтра', 'очень', 'снова', 'наконец', 'почти',
+    'тихо', 'быстро', 'красиво', 'интересно', 'странно', 'и', 'но', 'в',
+    'на', 'под', 'через', 'после', 'перед',
+)
+FIRST_NAMES = (
+    'Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна', 'Зоя',
+    'Иван', 'Кира', 'Лев', 'Мария', 'Никита', 'Ольга', 'Павел', 'Раиса',
+    'Семен', 'Таисия', 'Ульяна', 'Федор',
+)
+
+
+def zipf(rng, n):
+    """Ранг от 1 до n с вероятностью ~1/ранг: первые ранги — «звезды»."""
+    return min(int((n + 1) ** rng.random()), n)
+
+
+@lru_cache(maxsize=None)
+def _multiplier(n):
+    multiplier = 2654435761 % n or 1
+    while math.gcd(multiplier, n) != 1:
+        multiplier += 1
+    return multiplier
+
+
+def scatter(rank, n):
+    """Переводит ранг в id от 1 до n взаимно однозначно.
+
+    Популярные записи разбросаны по всей таблице, а не собраны
+    в ее начале."""
+    return rank * _multiplier(n) % n + 1
+
+
+def chunk_count(total):
+    return math.ceil(total / CHUNK_SIZE)
+
+
+def _ids(total, chunk):
+    return range(chunk * CHUNK_SIZE + 1,
+                 min((chunk + 1) * CHUNK_SIZE, total) + 1)
+
+
+def _text(rng, median_words=20):
+    """Текст с длинным хвостом длины: обычно короткий, изредка длинный."""
+    count = max(3, min(int(rng.lognormvariate(math.log(median_words),
+                                              0.8)), 400))
+    return ' '.join(rng.choices(WORDS, k=count)).capitalize() + '.'
+
+
+def _user(plan, rng):
+    return scatter(zipf(rng, plan['users']), plan['users'])
+
+
+def users(plan, chunk, rng):
+    total = plan['users']
+    for pk in _ids(total, chunk):
+        yield User(
+            id=pk,
+            username=f'user{pk}',
+            email=f'user{pk}@example.com',
+            first_name=rng.choice(FIRST_NAMES),
+            password=plan['password'],
+            date_joined=START + timedelta(days=DAYS * pk / total),
+        )
+
+
+def groups(plan, chunk, rng):
+    for pk in _ids(plan['groups'], chunk):
+        yield Group(
+            id=pk,
+            title=f'{rng.choice(WORDS).capitalize()} {pk}',
+            slug=f'group-{pk}',
+            description=_text(rng, 10),
+            author_id=_user(plan, rng),
+        )
+
+
+def posts(plan, chunk, rng):
+    """Посты отрезка времени задачи: публикации идут всплесками.
+
+    Авторы и группы выбираются по закону Ципфа: немногие пишут
+    большую часть постов, а у групп длинный хвост."""
+    span = DAYS * 86400 / chunk_count(plan['posts'])
+    start = START.timestamp() + chunk * span
+    centers = [start + rng.random() * span for _ in range(BURSTS)]
+    for pk in _ids(plan['posts'], chunk):
+        center = centers[zipf(rng, BURSTS) - 1]
+        pub_date = datetime.fromtimestamp(
+            center + rng.expovariate(1 / BURST_SECONDS), timezone.utc
+        )
+        group_id = None
+        if plan['groups'] and rng.random() >= NO_GROUP_SHARE:
+            group_id = zipf(rng, plan['groups'])
+        text = _text(rng)
+        yield Post(id=pk, text=text, excerpt=make_excerpt(text),
+                   pub_date=pub_date, modified=pub_date,
+                   author_id=_user(plan, rng), group_id=group_id)
+
+
+def follows(plan, chunk, rng):
+    """Подписки пользователей задачи.
+
+    Число подписок у пользователя распределено по Парето, а авторы
+    выбираются по Ципфу, поэтому число подписчиков — степенной закон.
+    id подписки вычисляется из id пользователя, чтобы не зависеть
+    от порядка вставки."""
+    total = plan['users']
+    # Среднее распределения Парето с alpha=2 — удвоенный минимум.
+    low = plan['follows'] / total / 2
+    cap = min(FOLLOWING_CAP, total - 1)
+    for user_id in _ids(total, chunk):
+        count = min(cap, int(low * rng.paretovariate(2)))
+        authors = set()
+        for _ in range(count * 3):
+            if len(authors) == count:
+                break
+            author_id = _user(plan, rng)
+            if author_id != user_id:
+                authors.add(author_id)
+        for index, author_id in enumerate(sorted(authors)):
+            yield Follow(id=(user_id - 1) * FOLLOWING_CAP + index + 1,
+                         user_id=user_id, author_id=author_id)
+
+
+def comments(plan, chunk, rng):
+    """Комментарии: больше всего их у немногих популярных постов.
+
+    Комментарий пишется через экспоненциальное время после поста,
+    даты постов читаются из базы пачками."""
+    ids = iter(_ids(plan['comments'], chunk))
+    while True:
+        batch = [
+            (pk, scatter(zipf(rng, plan['posts']), plan['posts']),
+             _user(plan, rng), _text(rng, 8), rng.expovariate(1 / 86400))
+            for pk in islice(ids, BATCH_SIZE)
+        ]
+        if not batch:
+            return
+        dates = dict(Post.objects.filter(
+            pk__in={post_id for _, post_id, *_ in batch}
+        ).values_list('pk', 'pub_date'))
+        for pk, post_id, author_id, text, delay in batch:
+            yield Comment(id=pk, post_id=post_id, author_id=author_id,
+                          text=text,
+                          pub_date=dates[post_id] + timedelta(seconds=delay))
+
+
+# Таблицы в порядке заполнения: внешние ключи ссылаются назад.
+TABLES = {
+    'users': (User, users),
+    'groups': (Group, groups),
+    'posts': (Post, posts),
+    'follows': (Follow, follows),
+    'comments': (Comment, comments),
+}
+
+
+def make_plan(seed, **counts):
+    """Параметры генерации, которые передаются процессам."""
+    return {
+        'seed': seed,
+        'password': make_password(PASSWORD, salt=f'yatube{seed}'),
+        **counts,
+    }
+
+
+def tasks(plan, table):
+    """Задачи (таблица, план, номер куска) для заполнения таблицы."""
+    total = plan['users'] if table == 'follows' else plan[table]
+    return [(table, plan, chunk) for chunk in range(chunk_count(total))]
+
+
+def use_database(path):
+    """Переключает соединение default на файл SQLite path.
+
+    Файл черновой, поэтому запись не ждет сброса на диск."""
+    connection = connections['default']
+    connection.close()
+    connection.settings_dict['NAME'] = path
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous = OFF')
+
+
+@contextmanager
+def _given_dates():
+    """Отключает auto_now и auto_now_add: даты задает генератор."""
+    fields = [Post._meta.get_field('pub_date'),
+              Post._meta.get_field('modified'),
+              Comment._meta.get_field('pub_date')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def write_chunk(task):
+    """Создает один кусок таблицы пачками bulk_create.
+
+    Генератор отдает строки по одной, поэтому в памяти держится только
+    текущая пачка. Кусок случаен от (seed, таблица, номер), так что
+    данные не зависят от числа процессов и порядка задач. Каждая пачка
+    пишется своей транзакцией без чтений: иначе SQLite не смогла бы
+    повысить блокировку при записи из нескольких процессов."""
+    table, plan, chunk = task
+    model, generate = TABLES[table]
+    rng = random.Random(f"{plan['seed']}:{table}:{chunk}")
+    rows = generate(plan, chunk, rng)
+    written = 0
+    with _given_dates():
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return table, written
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            written += len(batch)
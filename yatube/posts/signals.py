@@ -0,0 +1,299 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (counters, page_cache, search, tasks, thumbnails, timeline,
+               variants)
+from .models import Comment, Follow, Group, ImageVariant, Post, UserStats
+
+User = get_user_model()
+
+
+def _post_scopes(group_id, author_id):
+    scopes = [page_cache.GLOBAL_SCOPE, page_cache.author_scope(author_id)]
+    if group_id:
+        scopes.append(page_cache.group_scope(group_id))
+    return scopes
+
+
+# Счетчики обновляются первыми: на них смотрит раскладка лент.
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """У нового пользователя заводятся счетчики."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    """Новый пост или его перенос в другую группу меняет счетчики."""
+    if raw:
+        return
+    if created:
+        counters.add_user_stats(instance.author_id, posts_count=1)
+        counters.add_group_posts(instance.group_id, 1)
+        return
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id != instance.group_id:
+        counters.add_group_posts(old_group_id, -1)
+        counters.add_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    """Удаленный пост вычитается из счетчиков автора и группы."""
+    counters.add_user_stats(instance.author_id, posts_count=-1)
+    counters.add_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    """Новый комментарий увеличивает счетчик поста."""
+    if created and not raw:
+        counters.add_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    """Удаленный комментарий уменьшает счетчик поста."""
+    counters.add_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    """Подписка увеличивает счетчики автора и подписчика."""
+    if created and not raw:
+        counters.add_user_stats(instance.author_id, followers_count=1)
+        counters.add_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    """Отписка уменьшает счетчики автора и подписчика."""
+    counters.add_user_stats(instance.author_id, followers_count=-1)
+    counters.add_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора через очередь."""
+    if created and not raw:
+        tasks.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def notify_followers(sender, instance, created, raw=False, **kwargs):
+    """О новом посте подписчикам приходит письмо-дайджест."""
+    if created and not raw:
+        tasks.notify_followers(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Текст поста попадает в поисковый индекс."""
+    if not raw and (update_fields is None or 'text' in update_fields):
+        search.get_backend().index([(instance.pk, instance.text)])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Удаленный пост убирается из поискового индекса."""
+    search.get_backend().remove([instance.pk])
+
+
+def _image_changed(post):
+    return (post.image.name or '') != (post._old_image or '')
+
+
+@receiver(post_save, sender=Post)
+def make_thumbnails(sender, instance, raw=False, **kwargs):
+    """Миниатюры картинки создаются сразу, а не в первом запросе."""
+    if not raw and instance.image and _image_changed(instance):
+        thumbnails.schedule(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def make_variants(sender, instance, raw=False, **kwargs):
+    """Новая картинка поста нарезается на варианты для srcset."""
+    if not raw and _image_changed(instance):
+        variants.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def release_old_image(sender, instance, raw=False, **kwargs):
+    """Замененная картинка теряет ссылку в хранилище.
+
+    Повторная загрузка того же файла тоже добавила ссылку,
+    поэтому прежняя снимается и при неизменном имени."""
+    uploaded = getattr(instance, '_image_uploaded', False)
+    instance._image_uploaded = False
+    if not raw and instance._old_image and (
+        uploaded or _image_changed(instance)
+    ):
+        instance.image.storage.delete(instance._old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    """Картинка удаленного поста теряет ссылку в хранилище."""
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+
+
+@receiver(post_delete, sender=ImageVariant)
+def delete_variant_file(sender, instance, **kwargs):
+    """Файл варианта удаляется вместе с записью."""
+    instance.file.delete(save=False)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку поста.
+
+    Страницы прежней группы тоже устареют, а варианты картинки
+    пересоздаются, только если картинка сменилась."""
+    instance._old_group_id = None
+    instance._old_image = ''
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+        if old is not None:
+            instance._old_group_id, instance._old_image = old
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_pages(sender, instance, **kwargs):
+    """Изменение поста сбрасывает ленты главной, группы и автора."""
+    scopes = _post_scopes(instance.group_id, instance.author_id)
+    scopes.append(page_cache.post_scope(instance.pk))
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id and old_group_id != instance.group_id:
+        scopes.append(page_cache.group_scope(old_group_id))
+    page_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_pages(sender, instance, **kwargs):
+    """Комментарий сбрасывает ленты, в которых показан его пост."""
+    post = Post.objects.filter(
+        pk=instance.post_id
+    ).values_list('group_id', 'author_id').first()
+    if post is not None:
+        page_cache.bump(*_post_scopes(*post),
+                        page_cache.post_scope(instance.post_id))
+
+
+def _touch_posts(**filters):
+    """Сдвигает отметку изменения постов: их карточки перерисуются.
+
+    QuerySet.update() не шлет post_save, поэтому здесь же собираются
+    области страниц, где показаны эти посты: главная, их группы
+    и авторы. Возвращает эти области для page_cache.bump."""
+    posts = Post.objects.filter(**filters)
+    scopes = {page_cache.GLOBAL_SCOPE}
+    for group_id, author_id in posts.values_list(
+        'group_id', 'author_id'
+    ).distinct():
+        scopes.update(_post_scopes(group_id, author_id))
+    posts.update(modified=timezone.now())
+    return scopes
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_slug(sender, instance, **kwargs):
+    """Запоминает, меняется ли адрес группы."""
+    instance._slug_changed = instance.pk is not None and Group.objects.filter(
+        pk=instance.pk
+    ).exclude(slug=instance.slug).exists()
+
+
+@receiver(post_save, sender=Group)
+def touch_group_cards(sender, instance, **kwargs):
+    """Смена адреса группы меняет ссылки в карточках ее постов."""
+    if getattr(instance, '_slug_changed', False):
+        page_cache.bump(*_touch_posts(group_id=instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def touch_deleted_group_cards(sender, instance, **kwargs):
+    """У постов удаленной группы из карточек пропадает ссылка на нее.
+
+    После удаления у постов уже не будет группы, поэтому области
+    их страниц запоминаются заранее и сбрасываются в bump_group_pages."""
+    instance._page_scopes = _touch_posts(group_id=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_pages(sender, instance, **kwargs):
+    """Изменение группы сбрасывает ее страницы."""
+    page_cache.bump(page_cache.group_scope(instance.pk),
+                    *getattr(instance, '_page_scopes', ()))
+
+
+@receiver(pre_save, sender=User)
+def remember_old_username(sender, instance, update_fields=None, **kwargs):
+    """Запоминает, меняется ли имя пользователя."""
+    instance._username_changed = (
+        instance.pk is not None
+        and (update_fields is None or 'username' in update_fields)
+        and User.objects.filter(pk=instance.pk).exclude(
+            username=instance.username
+        ).exists()
+    )
+
+
+@receiver(post_save, sender=User)
+def touch_author_cards(sender, instance, **kwargs):
+    """Смена имени автора меняет подписи и ссылки в его карточках.
+
+    Сбрасываются все ленты с его постами и страницы постов,
+    где он оставил комментарии."""
+    if getattr(instance, '_username_changed', False):
+        commented = Comment.objects.filter(
+            author_id=instance.pk
+        ).values_list('post_id', flat=True).distinct()
+        page_cache.bump(
+            *_touch_posts(author_id=instance.pk),
+            *(page_cache.post_scope(post_id) for post_id in commented)
+        )
+
+
+@receiver(post_save, sender=User)
+def bump_author_pages(sender, instance, update_fields=None, **kwargs):
+    """Изменение пользователя сбрасывает его профиль.
+
+    Вход на сайт меняет только last_login и ленты не трогает."""
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        page_cache.bump(page_cache.author_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_pages(sender, instance, **kwargs):
+    """Подписка меняет счетчики и кнопку подписки в профилях."""
+    page_cache.bump(*(page_cache.author_scope(user_id) for user_id in
+                      (instance.user_id, instance.author_id) if user_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_timeline(sender, instance, created, raw=False, **kwargs):
+    """После подписки в ленту добавляются посты автора."""
+    if created and not raw and instance.user_id and instance.author_id:
+        timeline.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_timeline(sender, instance, **kwargs):
+    """После отписки посты автора убираются из ленты.
+
+    Если автор перестал быть популярным, его посты раскладываются
+    по лентам подписчиков в фоновой задаче."""
+    if instance.user_id and instance.author_id:
+        if timeline.unfollow(instance.user_id, instance.author_id):
+            tasks.push_author(instance.author_id)
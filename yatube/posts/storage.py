@@ -0,0 +1,200 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.files import ImageFieldFile
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from . import page_cache
+
+# Сколько постов переносит migrate_images за один проход.
+BATCH_SIZE: int = 500
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    """Хранилище файлов по содержимому.
+
+    Имя файла — sha256 содержимого в каталоге upload_to, разложенный
+    по двум уровням подкаталогов: posts/ab/cd/abcd….jpg. Одинаковые
+    загрузки хранятся одним файлом, а записи Blob считают ссылки на него:
+    delete() удаляет файл, только когда ссылок не осталось."""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save, совпадение — это дубликат.
+        return name
+
+    @staticmethod
+    def hash_content(content):
+        """sha256 содержимого, читаемого по частям."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def blob_name(name, digest):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4],
+                              digest + extension)
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        name = self.blob_name(name, self.hash_content(content))
+        with transaction.atomic():
+            blob, created = Blob.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': content.size, 'refs': 1}
+            )
+            if not created:
+                Blob.objects.filter(pk=blob.pk).update(refs=F('refs') + 1)
+            if created or not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        """Пишет файл через временное имя и os.replace.
+
+        Одновременная запись одного содержимого безопасна: файлы
+        одинаковые, и replace атомарен. FileSystemStorage._save здесь не
+        годится — при существующем файле он ищет свободное имя."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'wb') as temp_file:
+            for chunk in content.chunks():
+                temp_file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_path, self.file_permissions_mode)
+        os.replace(temp_path, path)
+
+    def delete(self, name):
+        """Снимает ссылку на файл; файл без ссылок удаляется после коммита.
+
+        Если внешняя транзакция откатится, ссылка вернется, а файл
+        останется на месте. Файлы без записи Blob (еще не перенесенные
+        командой migrate_post_images) не трогаются."""
+        from .models import Blob
+
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None or not blob.refs:
+                return
+            Blob.objects.filter(pk=blob.pk).update(refs=F('refs') - 1)
+            if blob.refs == 1:
+                transaction.on_commit(lambda: self._delete_unused(name))
+
+    def _delete_unused(self, name):
+        """Удаляет файл, если на него так и не появилось новых ссылок."""
+        from .models import Blob
+
+        with transaction.atomic():
+            deleted, _ = Blob.objects.filter(name=name, refs=0).delete()
+            if deleted:
+                FileSystemStorage.delete(self, name)
+
+
+class BlobImageFieldFile(ImageFieldFile):
+    """Картинка модели, которая помечает загрузку на экземпляре.
+
+    Загрузка того же содержимого дает то же имя, но добавляет ссылку
+    в Blob: по пометке _image_uploaded сигнал release_old_image снимает
+    прежнюю ссылку, даже если имя не изменилось."""
+
+    def save(self, name, content, save=True):
+        self.instance._image_uploaded = True
+        super().save(name, content, save)
+
+
+def blob_image_field(*args, **kwargs):
+    """ImageField с BlobImageFieldFile.
+
+    Тип поля остается ImageField, а схема и миграции не меняются."""
+    field = models.ImageField(*args, **kwargs)
+    field.attr_class = BlobImageFieldFile
+    return field
+
+
+def _image_exists(storage, name):
+    try:
+        return storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def _migrate_batch(storage, batch):
+    """Переносит пачку картинок в одной транзакции.
+
+    Возвращает старые имена перенесенных файлов, затронутые ленты
+    и число картинок без файла."""
+    from .models import Blob, Post
+
+    done = set(Blob.objects.filter(
+        name__in=[image for pk, image, *rest in batch]
+    ).values_list('name', flat=True))
+    old_names = []
+    scopes = {page_cache.GLOBAL_SCOPE}
+    missing = 0
+    with transaction.atomic():
+        for pk, image, group_id, author_id in batch:
+            if image in done:
+                continue
+            if not _image_exists(storage, image):
+                missing += 1
+                continue
+            with storage.open(image) as content:
+                name = storage.save(image, content)
+            Post.objects.filter(pk=pk).update(image=name,
+                                              modified=timezone.now())
+            old_names.append(image)
+            scopes.add(page_cache.author_scope(author_id))
+            if group_id:
+                scopes.add(page_cache.group_scope(group_id))
+    return old_names, scopes, missing
+
+
+def migrate_images(batch_size=BATCH_SIZE, keep_old=False):
+    """Переносит картинки постов из плоского каталога в BlobStorage.
+
+    Посты читаются пачками по id. После каждой пачки сбрасываются
+    ленты, где показаны перенесенные посты, и удаляются старые файлы
+    (если не keep_old), на которые больше не ссылается ни один пост.
+    Возвращает пару (перенесено, не найдено файлов)."""
+    from .models import Post
+
+    storage = Post._meta.get_field('image').storage
+    moved = missing = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Post.objects.filter(pk__gt=last_pk).exclude(image='').order_by(
+                'pk'
+            ).values_list('pk', 'image', 'group_id', 'author_id')[:batch_size]
+        )
+        if not batch:
+            return moved, missing
+        last_pk = batch[-1][0]
+        old_names, scopes, batch_missing = _migrate_batch(storage, batch)
+        moved += len(old_names)
+        missing += batch_missing
+        if not old_names:
+            continue
+        page_cache.bump(*scopes)
+        if keep_old:
+            continue
+        # Старый файл может быть у нескольких постов, и не все они
+        # в этой пачке: такой файл удалит пачка последнего из них.
+        still_used = set(Post.objects.filter(
+            image__in=old_names
+        ).values_list('image', flat=True))
+        for name in set(old_names) - still_used:
+            FileSystemStorage.delete(storage, name)
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from . import jobs, notifications, timeline
+from .models import Job, Post
+
+SEND_MAIL = 'mail.send'
+FAN_OUT = 'timeline.fan_out'
+PUSH_AUTHOR = 'timeline.push_author'
+NOTIFY = 'notifications.collect'
+SEND_DIGESTS = 'notifications.send'
+
+
+@jobs.task(SEND_MAIL, batch_size=50, idempotent=False)
+def send_mail(payloads):
+    """Отправляет пачку писем через одно соединение с почтовым сервером.
+
+    Управление возвращается после каждого письма, чтобы очередь
+    удалила его задачу: при ошибке ушедшие письма не повторяются."""
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for payload in payloads:
+            message = EmailMultiAlternatives(
+                payload['subject'], payload['body'], payload['from_email'],
+                payload['to'], connection=connection
+            )
+            if payload.get('html'):
+                message.attach_alternative(payload['html'], 'text/html')
+            message.send()
+            yield
+    finally:
+        connection.close()
+
+
+def queue_mail(subject, body, from_email, to, html=None):
+    """Ставит письмо в очередь вместо отправки в запросе."""
+    jobs.enqueue(SEND_MAIL, {
+        'subject': subject,
+        'body': body,
+        'from_email': from_email,
+        'to': list(to),
+        'html': html,
+    })
+
+
+@jobs.task(FAN_OUT, batch_size=20)
+def fan_out_posts(payloads):
+    """Раскладывает новые посты по лентам подписчиков.
+
+    Раскладка идемпотентна, поэтому повтор задачи безопасен."""
+    posts = Post.objects.filter(
+        pk__in=[payload['post_id'] for payload in payloads]
+    ).only('author', 'pub_date')
+    for post in posts:
+        timeline.fan_out_post(post)
+
+
+def fan_out(post):
+    """Ставит раскладку нового поста в очередь."""
+    jobs.enqueue(FAN_OUT, {'post_id': post.pk})
+
+
+@jobs.task(PUSH_AUTHOR, batch_size=20)
+def push_authors(payloads):
+    """Раскладывает посты авторов, переставших быть популярными.
+
+    push_author идемпотентна, поэтому повтор задачи безопасен."""
+    for author_id in {payload['author_id'] for payload in payloads}:
+        timeline.push_author(author_id)
+
+
+def push_author(author_id):
+    """Ставит раскладку постов бывшего популярного автора в очередь."""
+    jobs.enqueue(PUSH_AUTHOR, {'author_id': author_id})
+
+
+@jobs.task(NOTIFY, batch_size=20)
+def collect_notifications(payloads):
+    """Заводит уведомления подписчиков и планирует дайджест."""
+    notifications.collect([payload['post_id'] for payload in payloads])
+    schedule_digests()
+
+
+@jobs.task(SEND_DIGESTS)
+def send_digests(payloads):
+    """Рассылает накопленные за окно дайджеста уведомления."""
+    notifications.send_digests()
+
+
+def schedule_digests():
+    """Ставит отправку дайджестов через POSTS_DIGEST_WINDOW секунд.
+
+    Пока запланированная отправка не началась, новые уведомления
+    попадут в нее же, поэтому вторая задача не ставится."""
+    waiting = Job.objects.filter(task=SEND_DIGESTS, locked_by='')
+    if not waiting.exists():
+        jobs.enqueue(SEND_DIGESTS, delay=settings.POSTS_DIGEST_WINDOW)
+
+
+def notify_followers(post):
+    """Ставит уведомление подписчиков о новом посте в очередь."""
+    jobs.enqueue(NOTIFY, {'post_id': post.pk})
@@ -0,0 +1,35 @@
+from django import template
+
+register = template.Library()
+
+# Сколько соседних страниц показывать слева и справа от текущей.
+ON_EACH_SIDE: int = 2
+# Сколько страниц показывать в начале и в конце списка.
+ON_ENDS: int = 1
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=ON_EACH_SIDE, on_ends=ON_ENDS):
+    """Номера страниц вокруг текущей, первые и последние.
+
+    Пропуски отмечены None. Длина списка не зависит от числа страниц,
+    поэтому ссылки не перебирают весь page_range."""
+    num_pages = page_obj.paginator.num_pages
+    number = page_obj.number
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    window = []
+    start = number - on_each_side
+    if start > on_ends + 2:
+        window.extend(range(1, on_ends + 1))
+        window.append(None)
+    else:
+        start = 1
+    end = number + on_each_side
+    if end < num_pages - on_ends - 1:
+        window.extend(range(start, end + 1))
+        window.append(None)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(start, num_pages + 1))
+    return window
@@ -0,0 +1,40 @@
+from django import template
+
+from ..variants import FALLBACK_FORMAT, MIME_TYPES
+
+register = template.Library()
+
+# Ширина картинки в макете: карточка занимает всю колонку до 960px.
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def srcset(variants):
+    return ', '.join(f'{variant.file.url} {variant.width}w'
+                     for variant in variants)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def picture(post, sizes=SIZES):
+    """<picture> с вариантами картинки поста для srcset.
+
+    Пока варианты не созданы (или пост прочитан строкой PostRow),
+    выводится миниатюра sorl-thumbnail."""
+    by_format = {}
+    related = getattr(post, 'variants', None)
+    if related is not None and post.image:
+        for variant in related.all():
+            by_format.setdefault(variant.format, []).append(variant)
+    fallback = by_format.pop(FALLBACK_FORMAT, [])
+    return {
+        'post': post,
+        'sizes': sizes,
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': srcset(variants)}
+            for image_format, variants in sorted(
+                by_format.items(),
+                key=lambda item: list(MIME_TYPES).index(item[0])
+            )
+        ],
+        'fallback': fallback[-1] if fallback else None,
+        'fallback_srcset': srcset(fallback),
+    }
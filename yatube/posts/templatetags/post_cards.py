@@ -0,0 +1,39 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..page_cache import CARD_CACHE_TIMEOUT, card_cache_key
+
+register = template.Library()
+
+
+def thumbnail_pending(post):
+    thumbnail = getattr(post, 'thumbnail', None)
+    return thumbnail is not None and thumbnail.name == getattr(
+        post.image, 'name', post.image
+    )
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Пары (пост, html карточки) для страницы ленты.
+
+    Готовые карточки берутся из кеша одним get_many, недостающие
+    рендерятся и кладутся в кеш одним set_many. Карточка, в которой
+    вместо еще не готовой миниатюры стоит оригинал, не кешируется."""
+    posts = list(posts)
+    keys = [card_cache_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string('includes/card.html', {'post': post})
+            if not thumbnail_pending(post):
+                rendered[key] = card
+        cards.append((post, mark_safe(card)))
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,46 @@
+from functools import wraps
+from unittest import mock
+
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.urls import Resolver404, resolve
+
+from . import query_budget
+
+
+def _budgeted(request):
+    """Client.request, который проверяет бюджет запросов страницы."""
+    @wraps(request)
+    def wrapper(client, **environ):
+        with query_budget.record() as queries:
+            response = request(client, **environ)
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            path = environ['PATH_INFO']
+            try:
+                view_name = resolve(path).view_name
+            except Resolver404:
+                return response
+            query_budget.check(view_name, path, queries)
+        return response
+    return wrapper
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    """Запуск тестов, в котором каждый GET тестового клиента укладывается
+    в бюджет запросов posts.query_budget.BUDGETS.
+
+    Превышение роняет тест на вызове client.get с отчетом о запросах.
+    Бюджет постоянный: раннер сравнивает число запросов одного ответа
+    с пределом и не знает, сколько записей на странице. Что число
+    запросов не растет с числом постов и комментариев, проверяет
+    posts.tests.test_query_budget."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budget = mock.patch.object(Client, 'request',
+                                         _budgeted(Client.request))
+        self._budget.start()
+
+    def teardown_test_environment(self, **kwargs):
+        self._budget.stop()
+        super().teardown_test_environment(**kwargs)
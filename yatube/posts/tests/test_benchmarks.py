@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import TestCase
+
+from .. import benchmarks
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class BenchmarkTest(TestCase):
+    """Тест замеров страниц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Пост про город')
+        Comment.objects.create(post=cls.post, author=cls.user,
+                               text='Комментарий')
+
+    def setUp(self):
+        # Как и тестовый Client, не закрываем соединение с базой после
+        # запроса: иначе пропала бы транзакция теста.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def test_every_page_is_measured(self):
+        """Каждый посетитель проходит все страницы, кроме SKIP."""
+        results = benchmarks.run({'anon': None, 'user': self.user},
+                                 iterations=2, warmup=0)
+        names = [name for name, _ in benchmarks.routes()
+                 if name not in benchmarks.SKIP]
+        self.assertEqual(
+            sorted(results),
+            sorted(f'{viewer} {name}' for viewer in ('anon', 'user')
+                   for name in names)
+        )
+        index = results['user posts_list']
+        self.assertEqual(index['status'], 200)
+        self.assertGreater(index['bytes'], 0)
+        self.assertGreater(index['queries'], 0)
+        self.assertLessEqual(index['p50_ms'], index['p99_ms'])
+        self.assertEqual(results['anon post_create']['status'], 302)
+        self.assertEqual(results['anon post_detail']['path'],
+                         f'/posts/{self.post.pk}/')
+
+    def test_compare(self):
+        """Регрессией считается рост сверх допусков и смена кода."""
+        base = {'status': 200, 'p50_ms': 10.0, 'p95_ms': 20.0,
+                'p99_ms': 30.0, 'sql_ms': 0.5, 'queries': 3, 'bytes': 1000}
+        current = {**base, 'p50_ms': 11.5, 'p99_ms': 40.0, 'sql_ms': 1.2}
+        self.assertEqual(benchmarks.compare({'page': current},
+                                            {'page': base}), [])
+        current = {**base, 'status': 500, 'p50_ms': 13.0, 'queries': 4}
+        self.assertEqual(
+            benchmarks.compare({'page': current, 'new': current},
+                               {'page': base}),
+            ['page: код 200 -> 500', 'page: p50_ms 10.0 -> 13.0',
+             'page: queries 3 -> 4']
+        )
+        self.assertEqual(
+            benchmarks.compare({'page': current}, {'page': base},
+                               {'latency': 0.5, 'queries': 1}),
+            ['page: код 200 -> 500']
+        )
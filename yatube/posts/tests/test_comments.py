@@ -0,0 +1,71 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..views import COMMENTS_LIMIT
+
+User = get_user_model()
+
+
+class CommentPagesTest(TestCase):
+    """Тест постраничной загрузки комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TOTAL_COMMENTS = COMMENTS_LIMIT + 5
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        for i in range(cls.TOTAL_COMMENTS):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text='Комментарий ' + str(i))
+        cls.expected = list(cls.post.comments.order_by('-pub_date', '-pk'))
+        cls.detail_url = reverse('posts:post_detail',
+                                 kwargs={'post_id': cls.post.id})
+        cls.comments_url = reverse('posts:post_comments',
+                                   kwargs={'post_id': cls.post.id})
+
+    def test_first_page_inline(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(self.detail_url)
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.expected[:COMMENTS_LIMIT])
+        self.assertContains(
+            response,
+            f'{self.comments_url}?after={comments.paginator.next_cursor}'
+        )
+        self.assertContains(response,
+                            f'Комментариев:  <span>{self.TOTAL_COMMENTS}')
+
+    def test_next_page_fragment(self):
+        """Следующая страница отдается HTML-фрагментом."""
+        first = self.client.get(self.comments_url)
+        after = first.context['comments'].paginator.next_cursor
+        response = self.client.get(self.comments_url, {'after': after})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(list(response.context['comments']),
+                         self.expected[COMMENTS_LIMIT:])
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_next_page_json(self):
+        """С format=json страница отдается в JSON с токеном продолжения."""
+        data = self.client.get(self.comments_url, {'format': 'json'}).json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.expected[:COMMENTS_LIMIT]]
+        )
+        data = self.client.get(
+            self.comments_url, {'format': 'json', 'after': data['next']}
+        ).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next'])
+
+    def test_unknown_post(self):
+        """Для несуществующего поста возвращается 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,117 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import page_cache
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    """Тест ответов 304 на страницы, которые не изменились."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Пост')
+        cls.urls = [
+            reverse('posts:posts_list'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.user.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def etag(self, url):
+        """ETag страницы: первый показ запоминает ее области."""
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cookie', response['Vary'])
+        return response['ETag']
+
+    def test_not_modified_without_queries(self):
+        """Неизмененная страница отдается 304 без запросов к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.etag(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url,
+                                               HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_pages(self):
+        """Новый пост меняет ETag лент и профиля."""
+        etags = {url: self.etag(url) for url in self.urls}
+        Post.objects.create(author=self.user, group=self.group, text='Еще')
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.client.get(url,
+                                           HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_page(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = self.urls[3]
+        etag = self.etag(url)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет ETag профиля автора."""
+        url = self.urls[2]
+        etag = self.etag(url)
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_viewer_changes_etag(self):
+        """Вошедший пользователь получает свой ETag."""
+        url = self.urls[0]
+        etag = self.etag(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_if_modified_since(self):
+        """Анонимам отдается Last-Modified, и по нему тоже приходит 304."""
+        url = self.urls[0]
+        cache.set(f'posts:changed:{page_cache.GLOBAL_SCOPE}',
+                  time.time() - 60, None)
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.user, text='Еще')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rename_changes_index(self):
+        """Переименование автора меняет ETag главной."""
+        url = self.urls[0]
+        etag = self.etag(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.username = 'renamed'
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, reverse('posts:profile', args=['renamed'])
+        )
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import paginators
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    """Тест денормализованных счетчиков."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='вторая группа',
+            slug='another-slug',
+            description='Yet another description',
+        )
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(obj=obj, field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_posts_and_comments(self):
+        """Посты и комментарии считаются при создании, переносе и удалении."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Еще ответ')
+        self.assertCounters(self.user.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(post, comments_count=2)
+
+        comment.delete()
+        post.group = self.group2
+        post.save()
+        self.assertCounters(post, comments_count=1)
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.group2, posts_count=1)
+
+        post.delete()
+        self.assertCounters(self.user.stats, posts_count=0)
+        self.assertCounters(self.group2, posts_count=0)
+
+    def test_follows(self):
+        """Подписка и отписка меняют счетчики автора и подписчика."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertCounters(self.user.stats, followers_count=1)
+        self.assertCounters(self.reader.stats, following_count=1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertCounters(self.user.stats, followers_count=0)
+        self.assertCounters(self.reader.stats, following_count=0)
+
+    def test_save_skips_deferred_fields(self):
+        """save() записи из only() не пишет отложенные поля."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        post = Post.objects.only('id', 'group').get(pk=post.pk)
+        post.group = self.group2
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        update, = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertIn('"group_id"', update)
+        self.assertNotIn('"text"', update)
+        self.assertCounters(post, text='Пост', group=self.group2)
+
+    def test_pages_read_counters_without_aggregates(self):
+        """Профиль и пост показывают счетчики без COUNT(*)."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        )
+        # Небольшие ленты пажинатор перепроверяет COUNT(*), а большие
+        # берет из счетчика: здесь лента считается большой.
+        for url in urls:
+            with self.subTest(url=url), \
+                    mock.patch.object(paginators, 'EXACT_COUNT_LIMIT', 0):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, 'Всего постов')
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+    def test_reconcile_command(self):
+        """reconcile_counters исправляет расхождения и пропавшие строки."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.user)
+        UserStats.objects.filter(user=self.user).update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        Group.objects.update(posts_count=5)
+        Post.objects.update(comments_count=0)
+
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        self.assertCounters(UserStats.objects.get(user=self.user),
+                            posts_count=1, followers_count=1)
+        self.assertCounters(UserStats.objects.get(user=self.reader),
+                            posts_count=0, following_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(self.group2, posts_count=0)
+        self.assertCounters(post, comments_count=1)
@@ -90,7 +90,9 @@ class PostFormTests(TestCase):
         self.assertEqual(first_object.text, 'Тестовый текст')
         self.assertEqual(first_object.group, self.group)
         self.assertEqual(first_object.author, self.user)
-        self.assertEqual(first_object.image, 'posts/small.gif')
+        # Картинка хранится под sha256 содержимого.
+        self.assertRegex(first_object.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
 
     def test_add_comment(self):
         """Валидная форма создает комментарий к посту."""
@@ -155,7 +157,8 @@ class PostFormTests(TestCase):
         # Проверяю в нем все, что поменял
         self.assertEqual(post.text, 'Новый текст поста')
         self.assertEqual(post.group, self.group2)
-        self.assertEqual(post.image, 'posts/image.gif')
+        self.assertRegex(post.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
 
     def test_title_label(self):
         text_label = PostFormTests.form.fields['text'].label
@@ -0,0 +1,90 @@
+import re
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Follow, Group, Post, TimelineEntry
+from ..paginators import keyset
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+
+class FeedIndexesTest(TestCase):
+    """Запросы лент идут по индексам, без полного просмотра и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост',
+                                       group=cls.group)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_use_indexes(self):
+        """EXPLAIN каждого запроса лент не содержит SCAN и TEMP B-TREE."""
+        key = (timezone.now(), self.post.pk)
+        queries = {
+            'index': keyset(
+                Post.objects.select_related('author', 'group').all()),
+            'index_after': keyset(
+                Post.objects.select_related('author', 'group').all(), key),
+            'group_posts': keyset(
+                self.group.posts.select_related('author').all(), key),
+            'profile': keyset(
+                self.user.posts.select_related('group').all(), key),
+            'follow_index': keyset(
+                TimelineEntry.objects.select_related(
+                    'post__author', 'post__group'
+                ).filter(user=self.user), key, pk_field='post_id'),
+            'comments': self.post.comments.select_related('author').all(),
+            'following': Follow.objects.filter(user=self.user,
+                                               author=self.user),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                plan = self.query_plan(queryset[:11])
+                for step in plan:
+                    self.assertIsNone(FULL_SCAN.match(step), plan)
+                    self.assertNotIn('TEMP B-TREE', step, plan)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора невозможна."""
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, author=author)
+
+    def test_concurrent_follow(self):
+        """Подписка, созданная параллельным запросом, не роняет страницу."""
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        self.client.force_login(self.user)
+        # get_or_create не увидел подписку параллельного запроса
+        # и уперся в уникальность при вставке.
+        with mock.patch.object(Follow.objects, 'get_or_create',
+                               side_effect=IntegrityError):
+            response = self.client.get(
+                reverse('posts:profile_follow', args=[author.username])
+            )
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[author.username])
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=author).count(), 1
+        )
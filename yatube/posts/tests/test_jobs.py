@@ -0,0 +1,190 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import jobs, tasks
+from ..models import DeadJob, Follow, Job, Post, TimelineEntry
+from .utils import run_on_commit
+
+User = get_user_model()
+
+calls = []
+
+
+@jobs.task('tests.record', batch_size=10)
+def record(payloads):
+    calls.append([payload['n'] for payload in payloads])
+    if any(payload.get('fail') for payload in payloads):
+        raise RuntimeError('Задача упала')
+
+
+class RunInlineTest(TestCase):
+    """Тест выбора между воркерами и выполнением на месте."""
+
+    def test_inline_only_in_memory(self):
+        """На месте задачи выполняются только на базе в памяти (тесты)."""
+        self.assertTrue(jobs.run_inline())
+        with mock.patch.object(jobs.connection, 'is_in_memory_db',
+                               return_value=False):
+            self.assertFalse(jobs.run_inline())
+
+
+class JobQueueTest(TestCase):
+    """Тест фоновой очереди задач."""
+
+    def setUp(self):
+        calls.clear()
+        patcher = mock.patch.object(jobs, 'run_inline', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_inline_after_commit(self):
+        """На месте задача пишется в базу и выполняется после фиксации."""
+        with mock.patch.object(jobs, 'run_inline', return_value=True):
+            jobs.enqueue('tests.record', {'n': 1})
+        self.assertEqual(calls, [])
+        job = Job.objects.get()
+        self.assertEqual((job.locked_by, job.attempts),
+                         (jobs.worker_name(), 1))
+        run_on_commit()
+        self.assertEqual(calls, [[1]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_inline_job_is_retried(self):
+        """Упавшая задача на месте не роняет запись и ждет повтора."""
+        with mock.patch.object(jobs, 'run_inline', return_value=True):
+            jobs.enqueue('tests.record', {'n': 1, 'fail': True})
+        with self.assertLogs('posts.jobs', 'WARNING'):
+            run_on_commit()
+        job = Job.objects.get()
+        self.assertEqual((job.locked_by, job.attempts), ('', 1))
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('posts.jobs', 'WARNING'):
+            jobs.work(once=True)
+        self.assertEqual(calls, [[1], [1]])
+
+    def test_batch(self):
+        """Задачи одного вида выполняются пачкой и удаляются."""
+        for n in range(3):
+            jobs.enqueue('tests.record', {'n': n})
+        self.assertEqual(calls, [])
+        self.assertEqual(jobs.work(once=True), 3)
+        self.assertEqual(calls, [[0, 1, 2]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_unknown_task(self):
+        """Неизвестную задачу поставить нельзя."""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_claimed_job_is_leased(self):
+        """Забранную задачу не забирает другой воркер, пока идет аренда."""
+        jobs.enqueue('tests.record', {'n': 1})
+        self.assertEqual(len(jobs.claim('first')), 1)
+        self.assertEqual(jobs.claim('second'), [])
+        Job.objects.update(locked_until=timezone.now() - timedelta(1))
+        [job] = jobs.claim('second')
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_with_backoff(self):
+        """Упавшая задача откладывается с нарастающей задержкой."""
+        jobs.enqueue('tests.record', {'n': 1, 'fail': True})
+        before = timezone.now()
+        with self.assertLogs('posts.jobs', 'WARNING'):
+            jobs.work(once=True)
+        job = Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.locked_by, '')
+        self.assertIn('Задача упала', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at, before + timedelta(seconds=jobs.BACKOFF_BASE)
+        )
+        self.assertEqual(jobs.work(once=True), 0)
+        self.assertEqual(jobs.retry_delay(3), jobs.BACKOFF_BASE * 4)
+        self.assertEqual(jobs.retry_delay(100), jobs.BACKOFF_MAX)
+
+    def test_dead_letter(self):
+        """После последней попытки задача переносится в DeadJob."""
+        jobs.enqueue('tests.record', {'n': 1, 'fail': True}, max_attempts=2)
+        for _ in range(2):
+            Job.objects.update(run_at=timezone.now())
+            with self.assertLogs('posts.jobs', 'WARNING'):
+                jobs.work(once=True)
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.task, dead.attempts), ('tests.record', 2))
+        jobs.requeue(DeadJob.objects.all())
+        self.assertFalse(DeadJob.objects.exists())
+        self.assertEqual(Job.objects.get().attempts, 0)
+
+    def test_failed_batch_runs_one_by_one(self):
+        """Ошибка одной задачи пачки не откладывает остальные."""
+        jobs.enqueue('tests.record', {'n': 1})
+        jobs.enqueue('tests.record', {'n': 2, 'fail': True})
+        jobs.enqueue('tests.record', {'n': 3})
+        with self.assertLogs('posts.jobs', 'WARNING'):
+            jobs.work(once=True)
+        self.assertEqual(calls, [[1, 2, 3], [1], [2], [3]])
+        self.assertEqual(Job.objects.get().attempts, 1)
+
+    def test_failed_mail_is_not_resent(self):
+        """Письма пачки до упавшего не уходят второй раз."""
+        for address in ('a@yatube.ru', 'fail@yatube.ru', 'c@yatube.ru'):
+            tasks.queue_mail('Тема', 'Текст', 'from@yatube.ru', [address])
+        send_messages = locmem.EmailBackend.send_messages
+
+        def fail(backend, messages):
+            if messages[0].to == ['fail@yatube.ru']:
+                raise OSError
+            return send_messages(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.'
+                        'send_messages', autospec=True, side_effect=fail), \
+                self.assertLogs('posts.jobs', 'WARNING'):
+            jobs.work(once=True)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['a@yatube.ru'], ['c@yatube.ru']])
+        job = Job.objects.get()
+        self.assertIn('fail@yatube.ru', job.payload)
+        self.assertEqual(job.attempts, 1)
+
+    def test_mail_is_queued(self):
+        """Письма уходят из воркера одной пачкой."""
+        tasks.queue_mail('Тема', 'Текст', 'from@yatube.ru', ['a@yatube.ru'])
+        tasks.queue_mail('Тема', 'Текст', 'from@yatube.ru', ['b@yatube.ru'])
+        self.assertEqual(mail.outbox, [])
+        with mock.patch.object(tasks, 'get_connection',
+                               wraps=tasks.get_connection) as connection:
+            jobs.work(once=True)
+        connection.assert_called_once()
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['a@yatube.ru'], ['b@yatube.ru']])
+
+    def test_password_reset_is_queued(self):
+        """Письмо сброса пароля не отправляется в запросе."""
+        User.objects.create_user(username='auth', email='auth@yatube.ru',
+                                 password='pass')
+        response = self.client.post('/auth/password_reset/',
+                                    {'email': 'auth@yatube.ru'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().task, tasks.SEND_MAIL)
+        jobs.work(once=True)
+        self.assertEqual(mail.outbox[0].to, ['auth@yatube.ru'])
+
+    def test_fan_out_is_queued(self):
+        """Новый пост раскладывается по лентам воркером."""
+        author = User.objects.create_user(username='author')
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=author)
+        post = Post.objects.create(author=author, text='Пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        jobs.work(once=True)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=follower, post=post).exists()
+        )
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Group, Post
+from ..models import EXCERPT_LENGTH, Group, Post
 
 User = get_user_model()
 
@@ -32,3 +33,40 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class PostExcerptTest(TestCase):
+    """Тест начала текста поста и чтения ленты по полям карточки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.text = 'Начало. ' + 'Очень длинный пост. ' * 100 + 'Хвост'
+        cls.post = Post.objects.create(author=cls.user, text=cls.text)
+
+    def test_excerpt_follows_text(self):
+        """Начало текста обновляется вместе с текстом."""
+        self.assertEqual(len(self.post.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(self.post.excerpt.startswith('Начало.'))
+        post = Post.objects.get(pk=self.post.pk)
+        modified = post.modified
+        post.text = 'Короткий'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Короткий')
+        self.assertGreater(post.modified, modified)
+
+    def test_cards_skip_long_columns(self):
+        """Лента не читает полный текст поста и пароль автора."""
+        sql = str(Post.objects.cards().query)
+        self.assertNotIn('"posts_post"."text"', sql)
+        self.assertNotIn('"auth_user"."password"', sql)
+        self.assertIn('"posts_post"."excerpt"', sql)
+
+    def test_feed_shows_excerpt(self):
+        """В ленте видно только начало длинного поста."""
+        response = self.client.get(reverse('posts:profile',
+                                           args=[self.user.username]))
+        self.assertContains(response, 'Начало.')
+        self.assertNotContains(response, 'Хвост')
@@ -0,0 +1,131 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import jobs, notifications, tasks
+from ..models import Follow, Job, Notification, Post
+from .utils import run_on_commit
+
+User = get_user_model()
+
+
+class NotificationTest(TestCase):
+    """Тест писем подписчикам о новых постах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.followers = [
+            User.objects.create_user(username=f'follower{i}',
+                                     email=f'follower{i}@yatube.ru')
+            for i in range(3)
+        ]
+        cls.silent = User.objects.create_user(username='silent')
+        for user in (*cls.followers, cls.silent):
+            Follow.objects.create(user=user, author=cls.author)
+        Follow.objects.create(user=cls.followers[0], author=cls.other)
+
+    def test_posts_in_window_are_mailed_once(self):
+        """Посты за окно дайджеста уходят одним письмом после окна."""
+        first = Post.objects.create(author=self.author, text='Новый пост')
+        second = Post.objects.create(author=self.author, text='Еще пост')
+        run_on_commit()
+        self.assertEqual(mail.outbox, [])
+        job = Job.objects.get()
+        self.assertEqual(job.task, tasks.SEND_DIGESTS)
+        self.assertGreater(job.run_at, timezone.now())
+        Job.objects.update(run_at=timezone.now())
+        jobs.work(once=True)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [user.email for user in self.followers])
+        for post in (first, second):
+            self.assertIn(post.text, mail.outbox[0].body)
+        self.assertFalse(
+            Notification.objects.filter(sent__isnull=True).exists()
+        )
+        self.assertFalse(Job.objects.exists())
+
+    def test_digest_per_recipient(self):
+        """Посты за окно дайджеста приходят одним письмом на подписчика."""
+        with mock.patch.object(jobs, 'run_inline', return_value=False):
+            Post.objects.create(author=self.author, text='Первый')
+            Post.objects.create(author=self.other, text='Второй')
+            self.assertEqual(
+                Job.objects.filter(task=tasks.NOTIFY).count(), 2
+            )
+            jobs.work(once=True)
+            self.assertEqual(mail.outbox, [])
+            self.assertEqual(
+                Job.objects.filter(task=tasks.SEND_DIGESTS).count(), 1
+            )
+        self.assertEqual(notifications.send_digests(batch_size=2), 3)
+        by_email = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(len(by_email), 3)
+        digest = by_email[self.followers[0].email]
+        self.assertIn('Первый', digest.body)
+        self.assertIn('Второй', digest.body)
+        self.assertNotIn('Второй', by_email[self.followers[1].email].body)
+
+    def test_rerun_skips_sent(self):
+        """Повторная рассылка не пишет тем, кому письмо уже ушло."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        run_on_commit()
+        notifications.send_digests()
+        mail.outbox = []
+        notifications.collect([post.pk])
+        self.assertEqual(notifications.send_digests(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_one_connection_per_batch(self):
+        """Пачка писем уходит через одно соединение."""
+        with mock.patch.object(jobs, 'run_inline', return_value=False):
+            post = Post.objects.create(author=self.author, text='Пост')
+        notifications.collect([post.pk])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open',
+                        autospec=True) as open_connection:
+            self.assertEqual(notifications.send_digests(batch_size=2), 3)
+        self.assertEqual(open_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failed_send_keeps_delivered(self):
+        """Если письмо не ушло, повтор пишет только тем, кому не ушло."""
+        with mock.patch.object(jobs, 'run_inline', return_value=False):
+            post = Post.objects.create(author=self.author, text='Пост')
+        notifications.collect([post.pk])
+        send_messages = locmem.EmailBackend.send_messages
+
+        def fail_second(backend, messages):
+            if mail.outbox:
+                raise OSError
+            return send_messages(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.'
+                        'send_messages', autospec=True,
+                        side_effect=fail_second), \
+                self.assertRaises(OSError):
+            notifications.send_digests()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            Notification.objects.filter(sent__isnull=True).count(), 2
+        )
+        self.assertEqual(notifications.send_digests(), 2)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 3)
+
+    def test_crashed_claim_is_sent_later(self):
+        """Уведомления упавшей рассылки уходят после срока аренды."""
+        with mock.patch.object(jobs, 'run_inline', return_value=False):
+            post = Post.objects.create(author=self.author, text='Пост')
+        notifications.collect([post.pk])
+        notifications._claim([self.followers[0].pk])
+        self.assertEqual(notifications.send_digests(), 2)
+        claimed = Notification.objects.filter(sent__isnull=True)
+        self.assertEqual(claimed.count(), 1)
+        claimed.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 3)
@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTest(TestCase):
+    """Тест кеша страниц лент с версиями областей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='вторая группа',
+            slug='another-slug',
+            description='Yet another description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:posts_list'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cached_page_skips_feed_query(self):
+        """Повторный запрос главной не ходит в базу за лентой."""
+        self.client.get(self.urls[0])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[0])
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_new_post_shows_up_at_once(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(author=self.user, text='Свежий пост',
+                            group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_moved_post_leaves_old_group(self):
+        """Перенос поста в другую группу сбрасывает обе группы."""
+        old_url = self.urls[1]
+        new_url = reverse('posts:group_list', kwargs={'slug': 'another-slug'})
+        self.client.get(old_url)
+        self.client.get(new_url)
+        self.post.group = self.group2
+        self.post.save()
+        self.assertNotContains(self.client.get(old_url), 'Тестовый пост')
+        self.assertContains(self.client.get(new_url), 'Тестовый пост')
+
+    def test_other_scopes_stay_cached(self):
+        """Пост в другой группе не сбрасывает кеш этой группы."""
+        self.client.get(self.urls[1])
+        Post.objects.create(author=self.user, text='Пост второй группы',
+                            group=self.group2)
+        with self.assertNumQueries(1):
+            self.client.get(self.urls[1])
+
+    def test_comment_bumps_versions(self):
+        """Комментарий сбрасывает ленты, где показан его пост."""
+        key = self.client.get(self.urls[0]).context['page_cache_key']
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        self.assertNotEqual(
+            self.client.get(self.urls[0]).context['page_cache_key'], key
+        )
+
+    def test_anonymous_and_authorized_cached_apart(self):
+        """Гость и авторизованный пользователь получают разные ключи."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                guest = self.client.get(url)
+                authorized = self.authorized_client.get(url)
+                self.assertNotEqual(guest.context['page_cache_key'],
+                                    authorized.context['page_cache_key'])
+
+    def test_renamed_author_on_cached_pages(self):
+        """Новое имя автора сразу видно на всех лентах с его постами."""
+        author = User.objects.create_user(username='writer')
+        Post.objects.create(author=author, text='Пост автора',
+                            group=self.group)
+        Comment.objects.create(post=self.post, author=author,
+                               text='Комментарий автора')
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        for url in (*self.urls[:2], detail):
+            self.client.get(url)
+        author.username = 'renamed-writer'
+        author.save()
+        new_link = reverse('posts:profile',
+                           kwargs={'username': 'renamed-writer'})
+        for url in (*self.urls[:2], detail):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), new_link)
+
+    def test_group_change_on_cached_pages(self):
+        """Новый адрес или удаление группы сразу видны на лентах."""
+        group = Group.objects.create(title='Другая', slug='other',
+                                     description='Описание')
+        Post.objects.create(author=self.user, text='Пост', group=group)
+        pages = (self.urls[0], self.urls[2])
+        for url in pages:
+            self.client.get(url)
+        group.slug = 'moved'
+        group.save()
+        for url in pages:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url),
+                    reverse('posts:group_list', kwargs={'slug': 'moved'})
+                )
+        group.delete()
+        for url in pages:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), '/group/moved/')
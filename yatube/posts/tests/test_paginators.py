@@ -0,0 +1,188 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Post
+from ..page_cache import GLOBAL_SCOPE, count_cache_key
+from ..paginators import (EXACT_COUNT_LIMIT, CountingPaginator,
+                          CursorPaginator, decode_cursor, encode_cursor)
+from ..templatetags.pagination import page_window
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    """Тест пажинации по ключу (pub_date, id)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PAGINATOR_LIMIT = 10
+        cls.TOTAL_POSTS = 23
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text='Тестовый пост' + str(i))
+            for i in range(cls.TOTAL_POSTS)
+        )
+        # Одинаковая дата у всех постов: порядок держится только на id.
+        Post.objects.update(pub_date=timezone.now())
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def paginate(self, **params):
+        paginator = CursorPaginator(Post.objects.all(), self.PAGINATOR_LIMIT)
+        return paginator.get_cursor_page(params)
+
+    def test_walk_forward_and_back(self):
+        """Токены after/before обходят ленту без пропусков и повторов."""
+        page = self.paginate()
+        seen = list(page)
+        self.assertFalse(page.has_previous())
+        while page.has_next():
+            page = self.paginate(after=page.paginator.next_cursor)
+            self.assertTrue(page.has_previous())
+            seen.extend(page)
+        self.assertEqual(seen, self.expected)
+
+        page = self.paginate(before=page.paginator.previous_cursor)
+        self.assertEqual(list(page), self.expected[10:20])
+        page = self.paginate(before=page.paginator.previous_cursor)
+        self.assertEqual(list(page), self.expected[:10])
+        self.assertFalse(page.has_previous())
+
+    def test_page_number_fallback(self):
+        """Старые ссылки ?page=N работают для первых страниц."""
+        page = self.paginate(page='2')
+        self.assertEqual(list(page), self.expected[10:20])
+        self.assertTrue(page.has_previous())
+        self.assertTrue(page.has_next())
+        page = self.paginate(page='3')
+        self.assertEqual(list(page), self.expected[20:])
+        self.assertFalse(page.has_next())
+        for number in ('0', '100', 'last', '9'):
+            with self.subTest(number=number):
+                self.assertEqual(list(self.paginate(page=number)),
+                                 self.expected[:10])
+
+    def test_broken_token(self):
+        """Испорченный токен открывает первую страницу."""
+        for token in ('', 'garbage', encode_cursor(self.expected[9])[:-3]):
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+                self.assertEqual(list(self.paginate(after=token)),
+                                 self.expected[:10])
+
+    def test_single_query_per_page(self):
+        """Страница читается одним запросом, без COUNT(*)."""
+        cursor = encode_cursor(self.expected[9])
+        with self.assertNumQueries(1):
+            page = self.paginate(after=cursor)
+            self.assertEqual(list(page), self.expected[10:20])
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_views_use_cursor_links(self):
+        """Ленты отдают ссылку на следующую страницу по токену."""
+        response = self.client.get(reverse('posts:posts_list'))
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, f'?after={next_cursor}')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            {'after': next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         self.expected[10:20])
+
+
+class PageWindowTest(SimpleTestCase):
+    """Тест окна номеров страниц."""
+
+    def window(self, num_pages, number):
+        paginator = Paginator(range(num_pages), 1)
+        return page_window(paginator.page(number))
+
+    def test_few_pages_shown_all(self):
+        """Если страниц немного, показываются все."""
+        self.assertEqual(self.window(7, 4), [1, 2, 3, 4, 5, 6, 7])
+
+    def test_window(self):
+        """Вокруг текущей страницы окно, по краям первая и последняя."""
+        cases = {
+            1: [1, 2, 3, None, 100],
+            4: [1, 2, 3, 4, 5, 6, None, 100],
+            50: [1, None, 48, 49, 50, 51, 52, None, 100],
+            97: [1, None, 95, 96, 97, 98, 99, 100],
+            100: [1, None, 98, 99, 100],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(self.window(100, number), expected)
+
+    def test_render_does_not_grow_with_pages(self):
+        """Число ссылок в шаблоне не зависит от числа страниц."""
+        paginator = Paginator(range(10 ** 7), 10)
+        html = render_to_string('posts/includes/paginator.html',
+                                {'page_obj': paginator.page(500000)})
+        self.assertEqual(html.count('class="page-item'), 13)
+        self.assertIn('?page=1000000', html)
+
+
+@override_settings(POSTS_PAGINATION='pages')
+class CountingPaginatorTest(TestCase):
+    """Тест пажинатора со счетчиком и оценкой числа записей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text='Тестовый пост' + str(i))
+            for i in range(15)
+        )
+        cls.key = count_cache_key(GLOBAL_SCOPE)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_total_from_counter(self):
+        """Большое число из счетчика берется без COUNT(*)."""
+        paginator = CountingPaginator(Post.objects.all(), 10,
+                                      total=EXACT_COUNT_LIMIT)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(paginator.page(2)), 5)
+        self.assertEqual(paginator.count, EXACT_COUNT_LIMIT)
+        self.assertFalse(paginator.is_estimate)
+
+    def test_small_counter_is_checked(self):
+        """Небольшой счетчик перепроверяется: он мог отстать."""
+        paginator = CountingPaginator(Post.objects.all(), 10, total=0)
+        self.assertEqual(len(paginator.page(2)), 5)
+
+    def test_estimate_from_cache(self):
+        """Большое число из кеша отдается как оценка без COUNT(*)."""
+        cache.set(self.key, EXACT_COUNT_LIMIT * 10)
+        paginator = CountingPaginator(Post.objects.all(), 10,
+                                      count_key=self.key)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, EXACT_COUNT_LIMIT * 10)
+        self.assertTrue(paginator.is_estimate)
+
+    def test_small_count_is_exact(self):
+        """Небольшие выборки считаются точно и кладутся в кеш."""
+        cache.set(self.key, 3)
+        paginator = CountingPaginator(Post.objects.all(), 10,
+                                      count_key=self.key)
+        self.assertEqual(paginator.count, 15)
+        self.assertFalse(paginator.is_estimate)
+        self.assertEqual(cache.get(self.key), 15)
+
+    def test_index_says_about(self):
+        """Главная страница подписывает оценку словом «Примерно»."""
+        response = self.client.get(reverse('posts:posts_list'))
+        self.assertContains(response, 'Всего')
+        cache.set(self.key, EXACT_COUNT_LIMIT * 10)
+        response = self.client.get(reverse('posts:posts_list'), {'page': 2})
+        self.assertContains(response, 'Примерно')
+        self.assertContains(response, f'постов: {EXACT_COUNT_LIMIT * 10}')
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..page_cache import card_cache_key
+from ..templatetags.post_cards import post_cards
+
+User = get_user_model()
+
+
+class PostCardsTest(TestCase):
+    """Тест кеша отрисованных карточек постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            group=self.group,
+        )
+
+    def card(self):
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk)
+        return post_cards([post])[0][1]
+
+    def test_card_is_cached(self):
+        """Карточка рендерится один раз и дальше берется из кеша."""
+        card = self.card()
+        self.assertEqual(cache.get(card_cache_key(self.post)), card)
+        cache.set(card_cache_key(self.post), 'из кеша')
+        self.assertEqual(self.card(), 'из кеша')
+
+    def test_card_follows_changes(self):
+        """Правка поста, адреса группы или имени автора меняет карточку."""
+        self.card()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertIn('Новый текст', self.card())
+
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertIn(
+            reverse('posts:group_list', kwargs={'slug': 'new-slug'}),
+            self.card()
+        )
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertIn(
+            reverse('posts:profile', kwargs={'username': 'renamed'}),
+            self.card()
+        )
+
+    def test_deleted_group_leaves_card(self):
+        """После удаления группы ссылка на нее пропадает из карточки."""
+        group = Group.objects.create(title='Другая', slug='other',
+                                     description='Описание')
+        self.post.group = group
+        self.post.save()
+        self.assertIn('все записи группы', self.card())
+        group.delete()
+        self.assertNotIn('все записи группы', self.card())
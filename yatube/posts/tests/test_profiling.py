@@ -0,0 +1,111 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import profiling
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def timings(response):
+    """Фазы заголовка Server-Timing: {имя: параметры}."""
+    result = {}
+    for part in response['Server-Timing'].split(', '):
+        name, *params = part.split(';')
+        result[name] = params
+    return result
+
+
+class ProfilingDisabledTest(TestCase):
+    """Тест выключенных замеров."""
+
+    def test_no_header(self):
+        """Без POSTS_PROFILING ответы идут без Server-Timing."""
+        response = self.client.get(reverse('posts:posts_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(POSTS_PROFILING=True, POSTS_PROFILING_SAMPLE_RATE=0,
+                   POSTS_PROFILING_SLOW_MS=60_000,
+                   MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ProfilingTest(TestCase):
+    """Тест замеров фаз запроса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        content = BytesIO()
+        Image.new('RGB', (10, 10)).save(content, 'PNG')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост',
+            image=SimpleUploadedFile('small.png', content.getvalue(),
+                                     content_type='image/png')
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_phases(self):
+        """Server-Timing показывает SQL, сессию, шаблоны и миниатюры."""
+        response = self.client.get(reverse('posts:posts_list'))
+        phases = timings(response)
+        self.assertEqual(
+            list(phases), ['db', 'session', 'template', 'thumbnail', 'total']
+        )
+        self.assertRegex(phases['db'][1], r'desc="[1-9]\d* queries"')
+        total = float(phases['total'][0].split('=')[1])
+        for name in ('session', 'template', 'thumbnail'):
+            with self.subTest(phase=name):
+                duration = float(phases[name][0].split('=')[1])
+                self.assertLessEqual(duration, total)
+
+    def test_sampled_log(self):
+        """Выбранные запросы пишутся в лог одной строкой JSON."""
+        with self.assertLogs('posts.profiling', 'INFO') as logs, \
+                self.settings(POSTS_PROFILING_SAMPLE_RATE=1):
+            self.client.get(reverse('posts:post_detail',
+                                    args=[self.post.pk]))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:post_detail')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_slow_request_is_logged(self):
+        """Медленный запрос пишется в лог без выборки."""
+        with self.assertLogs('posts.profiling', 'INFO') as logs, \
+                self.settings(POSTS_PROFILING_SLOW_MS=0):
+            self.client.get(reverse('about:author'))
+            self.client.get(reverse('about:author'),
+                            REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('queries', json.loads(logs.records[0].getMessage()))
+        self.assertNotIn('queries',
+                         json.loads(logs.records[1].getMessage()))
+
+    def test_no_header_for_outsiders(self):
+        """Внешние посетители не видят Server-Timing, фазы не замеряются."""
+        with mock.patch.object(profiling, 'Profile') as profile:
+            response = self.client.get(reverse('posts:posts_list'),
+                                       REMOTE_ADDR='203.0.113.5')
+        self.assertFalse(response.has_header('Server-Timing'))
+        profile.assert_not_called()
@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import query_budget
+from ..models import Comment, Follow, Group, Post
+from ..views import COMMENTS_LIMIT, LIMIT
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+# Порог 0: подписки автора читаются как у звезды, лента /follow/
+# делает и запрос разложенных постов, и запрос постов звезд.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, TIMELINE_PULL_THRESHOLD=0)
+class QueryBudgetTest(TestCase):
+    """Тест бюджетов запросов страниц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.user)
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        # С картинкой: запрос миниатюр входит в бюджет лент.
+        content = BytesIO()
+        Image.new('RGB', (10, 10)).save(content, 'PNG')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост про город',
+            image=SimpleUploadedFile('small.png', content.getvalue(),
+                                     content_type='image/png')
+        )
+        Post.objects.create(author=cls.user, text='Пост читателя',
+                            image=cls.post.image.name)
+        Comment.objects.create(post=cls.post, author=cls.user,
+                               text='Комментарий')
+        cls.pages = {
+            'posts:posts_list': reverse('posts:posts_list'),
+            'posts:group_list': reverse('posts:group_list',
+                                        args=[cls.group.slug]),
+            'posts:profile': reverse('posts:profile',
+                                     args=[cls.author.username]),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         args=[cls.post.pk]),
+            'posts:post_comments': reverse('posts:post_comments',
+                                           args=[cls.post.pk]),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:search': reverse('posts:search') + '?q=город',
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:post_edit': reverse('posts:post_edit',
+                                       args=[cls.post.pk]),
+            'about:author': reverse('about:author'),
+            'about:tech': reverse('about:tech'),
+            'users:signup': reverse('users:signup'),
+            'users:login': reverse('users:login'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def queries(self, path):
+        """Запросы GET страницы с холодным кешем."""
+        cache.clear()
+        with query_budget.record() as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return queries
+
+    def grow(self):
+        """Больше постов и комментариев, чем помещается на страницу."""
+        other = Group.objects.create(title='Другая', slug='other',
+                                     description='Описание')
+        for i in range(LIMIT * 2):
+            Post.objects.create(author=self.author,
+                                group=self.group if i % 2 else other,
+                                text=f'Пост про город {i}',
+                                image=self.post.image.name)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=user, text='Комментарий')
+            for user in (self.author, self.user) * COMMENTS_LIMIT
+        )
+
+    def test_pages_fit_budget_at_any_size(self):
+        """Страница делает ровно бюджет запросов при любом числе записей."""
+        small = {name: len(self.queries(path))
+                 for name, path in self.pages.items()}
+        self.grow()
+        for name, path in self.pages.items():
+            with self.subTest(page=name):
+                queries = self.queries(path)
+                self.assertEqual(len(queries), small[name],
+                                 query_budget.report(queries))
+                self.assertEqual(len(queries), query_budget.BUDGETS[name],
+                                 query_budget.report(queries))
+
+    def test_report_shows_origin(self):
+        """Превышение бюджета показывает SQL и место в коде."""
+        path = self.pages['posts:post_detail']
+        queries = self.queries(path)
+        with mock.patch.dict(query_budget.BUDGETS,
+                             {'posts:post_detail': 1}), \
+                self.assertRaises(query_budget.QueryBudgetExceeded) as error:
+            query_budget.check('posts:post_detail', path, queries)
+        message = str(error.exception)
+        self.assertIn(f'{len(queries)} запросов при бюджете 1', message)
+        self.assertIn('FROM "posts_post"', message)
+        self.assertIn('posts/views.py', message)
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..read_models import PostRow
+
+User = get_user_model()
+
+
+class PostRowTest(TestCase):
+    """Тест чтения лент строками PostRow."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        for i in range(12):
+            Post.objects.create(author=cls.user, text='Пост ' + str(i),
+                                group=cls.group if i % 2 else None)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows_render_like_models(self):
+        """Карточка строки совпадает с карточкой модели."""
+        models = list(Post.objects.cards())
+        rows = list(Post.objects.cards().rows())
+        self.assertTrue(all(isinstance(row, PostRow) for row in rows))
+        self.assertEqual([row.pk for row in rows],
+                         [post.pk for post in models])
+        for post, row in zip(models, rows):
+            with self.subTest(post=post.pk):
+                self.assertEqual(
+                    render_to_string('includes/card.html', {'post': row}),
+                    render_to_string('includes/card.html', {'post': post})
+                )
+
+    def test_rows_have_no_dict(self):
+        """У строк нет __dict__: память только под поля из __slots__."""
+        row = Post.objects.cards().rows().first()
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertFalse(hasattr(row.author, '__dict__'))
+
+    @override_settings(POSTS_READ_MODEL='rows', POSTS_PAGINATION='cursor')
+    def test_views_use_rows(self):
+        """С флагом ленты читаются строками и листаются курсором."""
+        response = self.client.get(reverse('posts:posts_list'))
+        page = response.context['page_obj']
+        self.assertTrue(all(isinstance(row, PostRow) for row in page))
+        response = self.client.get(reverse('posts:posts_list'),
+                                   {'after': page.paginator.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        response = self.client.get(reverse('posts:group_list',
+                                           args=[self.group.slug]))
+        self.assertEqual(len(response.context['page_obj']), 6)
@@ -0,0 +1,116 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Post
+from .. import search
+from ..search import ContainsBackend, SearchPaginator, get_backend
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Тест полнотекстового поиска постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.often = Post.objects.create(
+            author=cls.user, text='Кот кот кот спит на диване'
+        )
+        cls.once = Post.objects.create(
+            author=cls.user,
+            text='Длинный рассказ про собаку, в конце появляется кот'
+        )
+        cls.other = Post.objects.create(author=cls.user, text='Про погоду')
+        cls.url = reverse('posts:search')
+
+    def ids(self, query):
+        return [pk for pk, score in get_backend().search(query)]
+
+    def test_ranking(self):
+        """Чаще упомянутое слово в коротком тексте выше в выдаче."""
+        self.assertEqual(self.ids('кот'), [self.often.pk, self.once.pk])
+
+    def test_case_and_all_words(self):
+        """Регистр не важен, в выдаче посты со всеми словами запроса."""
+        self.assertEqual(self.ids('КОТ собаку'), [self.once.pk])
+        self.assertEqual(self.ids('"; DROP'), [])
+        self.assertEqual(self.ids('!!!'), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.create(author=self.user, text='Жираф')
+        self.assertEqual(self.ids('жираф'), [post.pk])
+        post.text = 'Слон'
+        post.save()
+        self.assertEqual(self.ids('жираф'), [])
+        self.assertEqual(self.ids('слон'), [post.pk])
+        post.delete()
+        self.assertEqual(self.ids('слон'), [])
+
+    def test_cursor_pages(self):
+        """Выдача листается токеном after без повторов и пропусков."""
+        posts = [Post.objects.create(author=self.user, text='Енот ' + str(i))
+                 for i in range(5)]
+        seen = []
+        params = {}
+        while True:
+            paginator = SearchPaginator('енот', 2)
+            page = paginator.get_cursor_page(params)
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            params = {'after': paginator.next_cursor}
+        self.assertEqual(sorted(seen), sorted(post.pk for post in posts))
+        self.assertEqual(len(seen), len(posts))
+
+    def test_rebuild_command(self):
+        """Команда пересобирает индекс из таблицы постов."""
+        get_backend().clear()
+        self.assertEqual(self.ids('погоду'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn(str(Post.objects.count()), out.getvalue())
+        self.assertEqual(self.ids('погоду'), [self.other.pk])
+
+    def test_view(self):
+        """Страница поиска показывает найденные посты."""
+        response = self.client.get(self.url, {'q': 'кот'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.often, self.once])
+        self.assertContains(response, self.often.text)
+        self.assertNotContains(response, self.other.text)
+
+    def test_admin_search(self):
+        """Поиск в админке идет через индекс."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаку'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.once])
+
+    def test_fallback_without_sqlite(self):
+        """Вне SQLite посты сохраняются, а поиск идет без индекса."""
+        with mock.patch.object(search.connection, 'vendor', 'postgresql'), \
+                self.assertLogs('posts.search', 'WARNING'):
+            self.assertIsInstance(get_backend(), ContainsBackend)
+            post = Post.objects.create(author=self.user, text='Кот в сапогах')
+            post.delete()
+        backend = ContainsBackend()
+        self.assertEqual([pk for pk, score in backend.search('кот')],
+                         [self.once.pk, self.often.pk])
+        paginator = SearchPaginator('кот', 1, backend=backend)
+        page = paginator.get_cursor_page({})
+        self.assertEqual(list(page), [self.once])
+        page = SearchPaginator('кот', 1, backend=backend).get_cursor_page(
+            {'after': paginator.next_cursor}
+        )
+        self.assertEqual(list(page), [self.often])
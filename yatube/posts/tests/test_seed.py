@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.db.models import Count, F
+from django.test import TestCase
+
+from .. import seed
+from ..models import Comment, Follow, Post, User, make_excerpt
+
+
+class SeedTest(TestCase):
+    """Тест генератора данных seed_yatube."""
+
+    counts = {'users': 200, 'groups': 10, 'posts': 1000, 'follows': 2000,
+              'comments': 500}
+
+    def fill(self, seed_value=1):
+        plan = seed.make_plan(seed_value, **self.counts)
+        with mock.patch.object(seed, 'CHUNK_SIZE', 300):
+            for table in seed.TABLES:
+                for task in seed.tasks(plan, table):
+                    seed.write_chunk(task)
+        return plan
+
+    def test_rows(self):
+        """Строки созданы с заданными датами и отрывком текста."""
+        self.fill()
+        self.assertEqual(User.objects.count(), self.counts['users'])
+        self.assertEqual(Post.objects.count(), self.counts['posts'])
+        self.assertEqual(Comment.objects.count(), self.counts['comments'])
+        self.assertGreater(Follow.objects.count(), 1000)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+        post = Post.objects.order_by('?').first()
+        self.assertEqual(post.excerpt, make_excerpt(post.text))
+        self.assertLess(post.pub_date,
+                        datetime(2024, 1, 1, tzinfo=timezone.utc))
+        comment = Comment.objects.select_related('post').first()
+        self.assertGreater(comment.pub_date, comment.post.pub_date)
+
+    def test_deterministic(self):
+        """Одинаковый seed дает одинаковые данные при любом порядке кусков."""
+        plan = self.fill()
+        with mock.patch.object(seed, 'CHUNK_SIZE', 300):
+            rng = seed.random.Random(f"{plan['seed']}:posts:2")
+            generated = [(post.pk, post.text, post.pub_date)
+                         for post in seed.posts(plan, 2, rng)]
+        stored = list(Post.objects.filter(
+            pk__in=[pk for pk, *_ in generated]
+        ).order_by('pk').values_list('pk', 'text', 'pub_date'))
+        self.assertEqual(stored, generated)
+
+    def test_skew(self):
+        """Подписчики и посты сосредоточены у немногих авторов."""
+        self.fill()
+        followers = sorted(Follow.objects.values('author').annotate(
+            count=Count('pk')
+        ).values_list('count', flat=True), reverse=True)
+        self.assertGreater(followers[0], 10 * followers[len(followers) // 2])
+        top_posts = Post.objects.values('author').annotate(
+            count=Count('pk')
+        ).order_by('-count').first()['count']
+        self.assertGreater(top_posts, self.counts['posts'] // 20)
@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Blob, Post
+from .utils import run_on_commit
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BlobStorageTest(TestCase):
+    """Тест хранилища картинок по содержимому."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post(self, content=SMALL_GIF, name='meme.gif'):
+        post = Post(author=self.user, text='Пост')
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом в шардах."""
+        first = self.post(name='a.gif')
+        second = self.post(name='b.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}'
+                         r'\.gif$')
+        self.assertEqual(Blob.objects.get(name=first.image.name).refs, 2)
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется вместе с последним ссылающимся постом."""
+        first = self.post()
+        second = self.post()
+        name = first.image.name
+        first.delete()
+        self.assertTrue(self.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).refs, 1)
+        second.delete()
+        self.assertTrue(self.exists(name))
+        run_on_commit()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Замененная картинка теряет ссылку."""
+        post = self.post()
+        old = post.image.name
+        post.image.save('other.gif', ContentFile(SMALL_GIF + b'\x00'))
+        self.assertNotEqual(post.image.name, old)
+        run_on_commit()
+        self.assertFalse(self.exists(old))
+
+    def test_same_file_on_edit(self):
+        """Повторная загрузка того же файла не оставляет лишней ссылки."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.user)
+        for text in ('Картинка', 'Та же картинка'):
+            self.client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': text,
+                 'image': SimpleUploadedFile('meme.gif', SMALL_GIF,
+                                             content_type='image/gif')}
+            )
+        post.refresh_from_db()
+        name = post.image.name
+        self.assertEqual(post.text, 'Та же картинка')
+        self.assertEqual(Blob.objects.get(name=name).refs, 1)
+        with post.image.open('rb') as image:
+            content = image.read()
+        post.image.save('again.gif', ContentFile(content))
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(Blob.objects.get(name=name).refs, 1)
+        post.delete()
+        run_on_commit()
+        self.assertFalse(self.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+
+    def test_rolled_back_delete_keeps_file(self):
+        """Откат удаления поста оставляет и ссылку, и файл."""
+        post = self.post()
+        name = post.image.name
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            post.delete()
+            raise RuntimeError
+        run_on_commit()
+        self.assertTrue(self.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).refs, 1)
+
+    def test_migrate_command(self):
+        """Команда переносит старые файлы из posts/ и не трогает новые."""
+        legacy = default_storage.save('posts/legacy.gif',
+                                      ContentFile(SMALL_GIF))
+        post = Post.objects.create(author=self.user, text='Старый пост',
+                                   image=legacy)
+        migrated = self.post()
+        missing = Post.objects.create(author=self.user, text='Без файла',
+                                      image='posts/missing.gif')
+        out = StringIO()
+        call_command('migrate_post_images', batch_size=1, stdout=out)
+        self.assertIn('Перенесено картинок: 1', out.getvalue())
+        self.assertIn('Файлы не найдены: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, migrated.image.name)
+        self.assertEqual(Blob.objects.get(name=post.image.name).refs, 2)
+        self.assertFalse(self.exists(legacy))
+        missing.refresh_from_db()
+        self.assertEqual(missing.image.name, 'posts/missing.gif')
+        call_command('migrate_post_images', stdout=out)
+        self.assertEqual(Blob.objects.get(name=post.image.name).refs, 2)
+
+    def test_migrate_shared_file(self):
+        """Общий старый файл удаляется, только когда перенесены все посты."""
+        legacy = default_storage.save('posts/shared.gif',
+                                      ContentFile(SMALL_GIF))
+        posts = [Post.objects.create(author=self.user, text=f'Пост {i}',
+                                     image=legacy) for i in range(2)]
+        call_command('migrate_post_images', batch_size=1, stdout=StringIO())
+        self.assertFalse(self.exists(legacy))
+        names = set()
+        for post in posts:
+            post.refresh_from_db()
+            self.assertTrue(self.exists(post.image.name))
+            names.add(post.image.name)
+        self.assertEqual(len(names), 1)
+        self.assertEqual(Blob.objects.get(name=names.pop()).refs, 2)
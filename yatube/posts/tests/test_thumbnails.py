@@ -0,0 +1,190 @@
+import shutil
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+
+from .. import thumbnails
+from ..models import Lock, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class FakeExecutor:
+    """Пул, который запоминает задачи и выполняет их по команде."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.append((future, fn, args))
+        return future
+
+    def run(self):
+        for future, fn, args in self.jobs:
+            future.set_result(fn(*args))
+        self.jobs = []
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    """Тест создания миниатюр вне запроса."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.geometry, cls.options = thumbnails.THUMBNAILS[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def image(self, name):
+        content = BytesIO()
+        Image.new('RGB', (100, 60), 'red').save(content, 'PNG')
+        return SimpleUploadedFile(name, content.getvalue(), 'image/png')
+
+    def thumbnail(self, post):
+        return get_thumbnail(post.image, self.geometry, **self.options)
+
+    def test_created_on_save(self):
+        """Миниатюра готова сразу после сохранения поста."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=self.image('saved.png'))
+        with mock.patch.object(thumbnails, 'get_executor') as executor:
+            im = self.thumbnail(post)
+        executor.assert_not_called()
+        self.assertNotEqual(im.name, post.image.name)
+        self.assertEqual((im.width, im.height), (960, 339))
+
+    def test_pool_falls_back_to_original(self):
+        """Пока пул создает миниатюру, отдается оригинал, а задача одна."""
+        executor = FakeExecutor()
+        with mock.patch.object(thumbnails, 'run_inline',
+                               return_value=False), \
+                mock.patch.object(thumbnails, 'get_executor',
+                                  return_value=executor):
+            post = Post.objects.create(author=self.user, text='Пост',
+                                       image=self.image('pooled.png'))
+            self.assertEqual(self.thumbnail(post).name, post.image.name)
+            self.assertEqual(self.thumbnail(post).name, post.image.name)
+            self.assertEqual(len(executor.jobs), 1)
+            executor.run()
+            im = self.thumbnail(post)
+        self.assertNotEqual(im.name, post.image.name)
+        self.assertIsNotNone(default.kvstore.get(im))
+
+    def test_lock_shared_between_processes(self):
+        """Миниатюру, которую ставит другой процесс, этот не ставит.
+
+        Блокировку упавшего процесса забирают после ее срока."""
+        executor = FakeExecutor()
+        with mock.patch.object(thumbnails, 'run_inline',
+                               return_value=False), \
+                mock.patch.object(thumbnails, 'get_executor',
+                                  return_value=executor):
+            post = Post.objects.create(author=self.user, text='Пост',
+                                       image=self.image('shared.png'))
+            # Кеш у другого процесса свой: в нем блокировки нет.
+            cache.clear()
+            self.thumbnail(post)
+            self.assertEqual(len(executor.jobs), 1)
+            Lock.objects.update(expires=timezone.now() - timedelta(1))
+            cache.clear()
+            self.thumbnail(post)
+            self.assertEqual(len(executor.jobs), 2)
+            executor.run()
+        self.assertFalse(Lock.objects.exists())
+
+    def test_prefetch_one_get_many(self):
+        """Миниатюры страницы читаются из кеша sorl одним get_many.
+
+        Единственный запрос к базе — варианты картинок страницы."""
+        posts = [Post.objects.create(author=self.user, text=f'Пост {i}',
+                                     image=self.image(f'page{i}.png'))
+                 for i in range(3)]
+        expected = {post.pk: self.thumbnail(post).name for post in posts}
+        page = list(Post.objects.cards().order_by('pk'))
+        kv_cache = default.kvstore.cache
+        with mock.patch.object(kv_cache, 'get_many',
+                               wraps=kv_cache.get_many) as get_many, \
+                mock.patch.object(default.kvstore, 'get') as get, \
+                self.assertNumQueries(1):
+            thumbnails.prefetch_thumbnails(page, self.geometry,
+                                           self.options)
+        get_many.assert_called_once()
+        get.assert_not_called()
+        self.assertEqual({post.pk: post.thumbnail.name for post in page},
+                         expected)
+
+    def test_prefetch_schedules_missing(self):
+        """Недостающая миниатюра ставится в пул, а пост получает оригинал."""
+        executor = FakeExecutor()
+        with mock.patch.object(thumbnails, 'run_inline',
+                               return_value=False), \
+                mock.patch.object(thumbnails, 'get_executor',
+                                  return_value=executor):
+            post = Post.objects.create(author=self.user, text='Пост',
+                                       image=self.image('missing.png'))
+            executor.jobs = []
+            cache.clear()
+            Lock.objects.all().delete()
+            page = list(Post.objects.cards().rows())
+            thumbnails.prefetch_thumbnails(page, self.geometry,
+                                           self.options)
+            self.assertEqual(len(executor.jobs), 1)
+        self.assertEqual(page[0].thumbnail.name, post.image.name)
+
+    def test_page_cache_dropped_when_ready(self):
+        """Страница, закешированная с оригиналом, получает миниатюру."""
+        executor = FakeExecutor()
+        with mock.patch.object(thumbnails, 'run_inline',
+                               return_value=False), \
+                mock.patch.object(thumbnails, 'get_executor',
+                                  return_value=executor):
+            post = Post.objects.create(author=self.user, text='Пост',
+                                       image=self.image('cached.png'))
+            url = reverse('posts:posts_list')
+            response = self.client.get(url)
+            self.assertContains(response, post.image.url)
+            executor.run()
+            response = self.client.get(url)
+        self.assertContains(response, self.thumbnail(post).url)
+        self.assertNotContains(response, post.image.url)
+
+    @override_settings(POSTS_READ_MODEL='rows')
+    def test_index_without_storage_io(self):
+        """Лента рендерится без обращений к хранилищу по каждому посту."""
+        for i in range(3):
+            Post.objects.create(author=self.user, text=f'Пост {i}',
+                                image=self.image(f'index{i}.png'))
+        storage = Post._meta.get_field('image').storage
+        with mock.patch.object(default.kvstore, 'get') as get, \
+                mock.patch.object(storage, 'exists') as exists, \
+                mock.patch.object(storage, 'open') as storage_open:
+            response = self.client.get(reverse('posts:posts_list'))
+        get.assert_not_called()
+        exists.assert_not_called()
+        storage_open.assert_not_called()
+        self.assertEqual(len(response.context['page_obj']), 3)
+        for post in response.context['page_obj']:
+            self.assertContains(response, post.thumbnail.url)
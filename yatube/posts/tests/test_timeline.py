@@ -0,0 +1,192 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import jobs, tasks, timeline
+from ..models import Follow, Job, Post, TimelineEntry, UserStats
+from .utils import run_on_commit
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    """Тест материализованной ленты подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Пост до подписки')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def timeline_posts(self):
+        return [entry.post for entry in self.user.timeline.all()]
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        """Подписка добавляет старые посты автора, отписка убирает."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает только в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        Post.objects.create(author=self.stranger, text='Чужой пост')
+        run_on_commit()
+        self.assertEqual(self.timeline_posts(), [post, self.old_post])
+        post.delete()
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_follow_backfills_latest_posts(self):
+        """Подписка добавляет в ленту только последние посты автора."""
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(3)]
+        with mock.patch.object(timeline, 'BACKFILL_LIMIT', 2):
+            Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.timeline_posts(), posts[:0:-1])
+
+    def test_follow_index_reads_timeline(self):
+        """Страница /follow/ читает ленту без join по Follow."""
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.old_post])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        # bulk_create не шлет сигналы, такие посты подбирает только rebuild.
+        Post.objects.bulk_create([Post(author=self.author, text='Импорт')])
+        TimelineEntry.objects.create(user=self.user, post=Post.objects.create(
+            author=self.stranger, text='Лишняя запись'
+        ), pub_date=self.old_post.pub_date)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            set(self.timeline_posts()),
+            set(Post.objects.filter(author=self.author))
+        )
+
+    def test_rebuild_commits_per_author(self):
+        """Пересборка пишет строки каждого автора в своей транзакции."""
+        for author in (self.author, self.stranger):
+            Follow.objects.create(user=self.user, author=author)
+        Post.objects.create(author=self.stranger, text='Пост')
+        TimelineEntry.objects.all().delete()
+        with mock.patch.object(timeline, 'transaction',
+                               wraps=transaction) as wrapped:
+            self.assertEqual(timeline.rebuild(), 2)
+        self.assertEqual(wrapped.atomic.call_count, 2)
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+
+
+@override_settings(TIMELINE_PULL_THRESHOLD=1)
+class HybridTimelineTest(TestCase):
+    """Тест смешанной ленты: популярные авторы читаются при просмотре."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        for author in (self.star, self.author):
+            Follow.objects.create(user=self.user, author=author)
+        Follow.objects.create(user=self.fan, author=self.star)
+
+    def timeline_posts(self):
+        return [entry.post for entry in self.user.timeline.all()]
+
+    def test_star_posts_are_pulled(self):
+        """Посты популярного автора не пишутся в ленты, но видны в них."""
+        posts = []
+        for i in range(12):
+            posts.append(Post.objects.create(
+                author=self.star if i % 3 else self.author,
+                text='Пост ' + str(i)
+            ))
+        run_on_commit()
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists()
+        )
+        expected = sorted(posts, key=lambda post: (post.pub_date, post.pk),
+                          reverse=True)
+        url = reverse('posts:follow_index')
+        response = self.authorized_client.get(url)
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), expected[:10])
+        response = self.authorized_client.get(
+            url, {'after': page_obj.paginator.next_cursor})
+        self.assertEqual(list(response.context['page_obj']), expected[10:])
+
+    def test_star_below_threshold_is_pushed_again(self):
+        """Когда автор теряет популярность, его посты раскладываются."""
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        run_on_commit()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_push_after_concurrent_unfollows(self):
+        """Раскладка не пропускается, если порог прошли сразу вниз."""
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        run_on_commit()
+        # Другая отписка уже уменьшила счетчик: эта его не увидит на пороге.
+        UserStats.objects.filter(user=self.star).update(
+            followers_count=F('followers_count') - 1
+        )
+        with mock.patch.object(jobs, 'run_inline', return_value=False):
+            Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertTrue(Job.objects.filter(task=tasks.PUSH_AUTHOR).exists())
+        jobs.work(once=True)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertFalse(UserStats.objects.get(user=self.star).timeline_pulled)
+        TimelineEntry.objects.all().delete()
+        timeline.push_author(self.star.pk)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_rebuild_selects_stars_by_subquery(self):
+        """rebuild отбирает звезд подзапросом и ставит им отметку."""
+        Post.objects.create(author=self.star, text='Пост звезды')
+        post = Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.update(timeline_pulled=False)
+        with CaptureQueriesContext(connection) as queries:
+            timeline.rebuild()
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT "posts_userstats"."user_id"')
+            for query in queries.captured_queries
+        ))
+        self.assertEqual(self.timeline_posts(), [post])
+        self.assertEqual(
+            list(UserStats.objects.filter(timeline_pulled=True)
+                 .values_list('user_id', flat=True)),
+            [self.star.pk]
+        )
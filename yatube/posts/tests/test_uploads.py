@@ -0,0 +1,168 @@
+import random
+import struct
+import zlib
+from io import BytesIO
+from unittest import mock
+
+from django import forms
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from PIL import Image, ImageOps, PngImagePlugin, features
+
+from .. import uploads
+from ..forms import PostForm
+
+
+def jpeg(size, exif=None):
+    """Большая синтетическая фотография: градиент быстро кодируется."""
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    content = BytesIO()
+    image.save(content, 'JPEG', quality=95,
+               exif=exif.tobytes() if exif else b'')
+    return SimpleUploadedFile('photo.jpg', content.getvalue(), 'image/jpeg')
+
+
+def png_header(width, height):
+    """PNG 1x1, в заголовке которого записан другой размер."""
+    content = BytesIO()
+    Image.new('L', (1, 1)).save(content, 'PNG')
+    data = bytearray(content.getvalue())
+    ihdr = bytes(data[12:16]) + struct.pack('>II', width, height) + bytes(
+        data[24:29]
+    )
+    data[12:29] = ihdr
+    data[29:33] = struct.pack('>I', zlib.crc32(ihdr))
+    return SimpleUploadedFile('bomb.png', bytes(data), 'image/png')
+
+
+def noise(mode, size, seed=0):
+    """Шум: картинка, которую не сжать без потерь."""
+    data = random.Random(seed).randbytes(
+        size[0] * size[1] * len(Image.new(mode, (1, 1)).getbands())
+    )
+    return Image.frombytes(mode, size, data)
+
+
+class NormalizeImageTest(SimpleTestCase):
+    """Тест проверки и перекодирования загруженных картинок."""
+
+    def test_large_photo_capped_and_stripped(self):
+        """Фото 24 Мп уменьшается, поворачивается по EXIF и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°.
+        exif[0x010f] = 'Phone'
+        with mock.patch.object(uploads.ImageOps, 'exif_transpose',
+                               wraps=ImageOps.exif_transpose) as transpose:
+            result = uploads.normalize_image(jpeg((6000, 4000), exif))
+        decoded = transpose.call_args[0][0].size
+        self.assertLessEqual(max(decoded), uploads.MAX_DIMENSION * 2)
+        image = Image.open(result)
+        self.assertEqual(image.size, (1365, 2048))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertLessEqual(result.size, uploads.MAX_STORED_SIZE)
+        self.assertEqual(result.name, 'photo.jpg')
+
+    def test_decompression_bomb_rejected(self):
+        """Бомба распаковки отклоняется по заголовку, не декодируясь."""
+        with mock.patch.object(uploads.ImageOps, 'exif_transpose') as load:
+            with self.assertRaises(forms.ValidationError):
+                uploads.normalize_image(png_header(30000, 30000))
+        load.assert_not_called()
+
+    def test_oversized_file_rejected(self):
+        """Слишком большой файл отклоняется до открытия."""
+        with mock.patch.object(uploads, 'MAX_UPLOAD_SIZE', 1000), \
+                mock.patch.object(uploads.Image, 'open') as image_open:
+            with self.assertRaises(forms.ValidationError):
+                uploads.normalize_image(jpeg((100, 100)))
+        image_open.assert_not_called()
+
+    def test_small_png_keeps_format(self):
+        """Небольшая картинка сохраняет формат и прозрачность."""
+        content = BytesIO()
+        Image.new('RGBA', (50, 50), (255, 0, 0, 128)).save(content, 'PNG')
+        upload = SimpleUploadedFile('small.png', content.getvalue())
+        image = Image.open(uploads.normalize_image(upload))
+        self.assertEqual((image.format, image.mode, image.size),
+                         ('PNG', 'RGBA', (50, 50)))
+
+    def test_png_stripped(self):
+        """PNG теряет EXIF, профиль ICC и текстовые чанки."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Phone'
+        exif[0x0131] = 'Editor'
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Comment', 'secret')
+        content = BytesIO()
+        Image.new('RGB', (50, 50)).save(
+            content, 'PNG', exif=exif.tobytes(), pnginfo=text,
+            icc_profile=b'profile'
+        )
+        upload = SimpleUploadedFile('small.png', content.getvalue())
+        image = Image.open(uploads.normalize_image(upload))
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(image.info, {})
+
+    def test_lossless_formats_bounded(self):
+        """PNG и GIF, которые не сжать, уменьшаются до MAX_STORED_SIZE."""
+        limit = 300_000
+        for image_format, mode in (('PNG', 'RGB'), ('PNG', 'RGBA'),
+                                   ('GIF', 'L')):
+            with self.subTest(image_format=image_format, mode=mode), \
+                    mock.patch.object(uploads, 'MAX_STORED_SIZE', limit):
+                content = BytesIO()
+                noise(mode, (1000, 1000)).save(content, image_format)
+                upload = SimpleUploadedFile('noise', content.getvalue())
+                result = uploads.normalize_image(upload)
+                image = Image.open(result)
+                self.assertLessEqual(result.size, limit)
+                self.assertEqual(image.format, image_format)
+                self.assertGreaterEqual(max(image.size),
+                                        uploads.MIN_DIMENSION)
+
+    def test_animation_bounded(self):
+        """Анимация, которая не влезает, уменьшается со всеми кадрами."""
+        frames = [noise('L', (600, 600), seed) for seed in range(3)]
+        content = BytesIO()
+        frames[0].save(content, 'GIF', save_all=True,
+                       append_images=frames[1:], duration=80, loop=0)
+        upload = SimpleUploadedFile('anim.gif', content.getvalue())
+        with mock.patch.object(uploads, 'MAX_STORED_SIZE', 300_000):
+            result = uploads.normalize_image(upload)
+        image = Image.open(result)
+        self.assertLessEqual(result.size, 300_000)
+        self.assertEqual(image.n_frames, 3)
+        self.assertLess(max(image.size), 600)
+
+    def test_animation_keeps_frames(self):
+        """У анимации уменьшаются все кадры, длительности сохраняются."""
+        formats = ['GIF'] + (['WEBP'] if features.check('webp_anim') else [])
+        for image_format in formats:
+            with self.subTest(image_format=image_format):
+                frames = [Image.new('RGB', (3000, 100), color)
+                          for color in ('red', 'green', 'blue')]
+                content = BytesIO()
+                frames[0].save(content, image_format, save_all=True,
+                               append_images=frames[1:], duration=80, loop=0)
+                upload = SimpleUploadedFile('anim', content.getvalue())
+                image = Image.open(uploads.normalize_image(upload))
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.n_frames, 3)
+                self.assertEqual(image.size, (2048, 68))
+                self.assertEqual(image.info['duration'], 80)
+                image.seek(2)
+                red, green, blue, *_ = image.convert('RGB').getpixel((0, 0))
+                self.assertGreater(blue, red)
+
+    def test_form_normalizes_upload(self):
+        """Форма поста отдает на сохранение уже перекодированную картинку."""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': jpeg((4000, 3000))})
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data['image'])
+        self.assertEqual(image.size, (2048, 1536))
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': png_header(30000, 30000)})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,147 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import page_cache, variants
+from ..models import ImageVariant, Post
+from ..variants import VARIANT_WIDTHS, available_formats, generate_variants
+from .test_thumbnails import FakeExecutor
+from .utils import run_on_commit
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class WorkerExecutor(FakeExecutor):
+    """Пул, у процессов которого свой кеш: их сбросы страниц не видны."""
+
+    def run(self):
+        for future, fn, args in self.jobs:
+            with mock.patch.object(page_cache, 'bump'):
+                result = fn(*args)
+            future.set_result(result)
+        self.jobs = []
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantTest(TestCase):
+    """Тест вариантов картинки поста и тега picture."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def image(self, name, size=(1200, 800), color='red'):
+        content = BytesIO()
+        Image.new('RGBA', size, color).save(content, 'PNG')
+        return SimpleUploadedFile(name, content.getvalue(), 'image/png')
+
+    def render(self, post):
+        return Template('{% load pictures %}{% picture post %}').render(
+            Context({'post': post})
+        )
+
+    def test_variants_created(self):
+        """Каждая ширина создается в каждом доступном формате."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=self.image('big.png'))
+        modified = post.modified
+        generate_variants(post.pk)
+        variants = list(post.variants.all())
+        self.assertEqual(len(variants),
+                         len(VARIANT_WIDTHS) * len(available_formats()))
+        self.assertEqual(
+            [(variant.width, variant.height) for variant in variants
+             if variant.format == 'jpeg'],
+            [(320, 113), (640, 226), (960, 339)]
+        )
+        post.refresh_from_db()
+        self.assertGreater(post.modified, modified)
+
+    def test_picture_srcset(self):
+        """Тег picture выводит srcset по всем ширинам."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=self.image('srcset.png'))
+        self.assertNotIn('<picture>', self.render(post))
+        generate_variants(post.pk)
+        html = self.render(Post.objects.get(pk=post.pk))
+        self.assertIn('<picture>', html)
+        for width in VARIANT_WIDTHS:
+            self.assertIn(f'{width}w', html)
+        self.assertEqual(html.count('<source'),
+                         len(available_formats()) - 1)
+
+    def test_old_variants_removed(self):
+        """Смена картинки удаляет прежние варианты вместе с файлами."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=self.image('old.png'))
+        generate_variants(post.pk)
+        old = list(post.variants.all())
+        post.image = self.image('new.png', color='blue')
+        post.save()
+        generate_variants(post.pk)
+        self.assertEqual(post.variants.count(), len(old))
+        self.assertFalse(
+            ImageVariant.objects.filter(pk__in=[v.pk for v in old]).exists()
+        )
+        storage = old[0].file.storage
+        self.assertFalse(any(storage.exists(v.file.name) for v in old))
+        post.image = ''
+        post.save()
+        generate_variants(post.pk)
+        self.assertFalse(post.variants.exists())
+
+    def test_image_changed_during_generation(self):
+        """Смена картинки во время генерации пересоздает варианты."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=self.image('first.png'))
+        encode = variants.encode
+
+        def edit_once(image, width, image_format):
+            if not edit_once.done:
+                edit_once.done = True
+                edited = Post.objects.get(pk=post.pk)
+                edited.image = self.image('second.png', color='blue')
+                edited.save()
+            return encode(image, width, image_format)
+
+        edit_once.done = False
+        with mock.patch.object(variants, 'encode', side_effect=edit_once):
+            generate_variants(post.pk)
+        post.refresh_from_db()
+        variant = post.variants.get(format='jpeg', width=320)
+        with variant.file.open('rb') as content:
+            red, green, blue = Image.open(content).getpixel((0, 0))
+        self.assertGreater(blue, red)
+
+    def test_pages_dropped_in_scheduling_process(self):
+        """Страницы сбрасывает процесс, который поставил варианты в пул."""
+        cache.clear()
+        executor = WorkerExecutor()
+        with mock.patch.object(variants, 'run_inline', return_value=False), \
+                mock.patch.object(variants, 'get_executor',
+                                  return_value=executor):
+            Post.objects.create(author=self.user, text='Пост',
+                                image=self.image('pool.png'))
+            run_on_commit()
+            url = reverse('posts:posts_list')
+            self.assertNotContains(self.client.get(url), '<picture>')
+            executor.run()
+        self.assertContains(self.client.get(url), '<picture>')
@@ -0,0 +1,13 @@
+from django.db import connection
+
+
+def run_on_commit():
+    """Выполняет отложенные transaction.on_commit внутри TestCase.
+
+    TestCase не фиксирует транзакцию, поэтому без этого отложенные
+    действия не выполнились бы никогда. Действия, отложенные самими
+    действиями (задача ставит задачу), тоже выполняются."""
+    while connection.run_on_commit:
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
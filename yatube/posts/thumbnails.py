@@ -0,0 +1,246 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from . import locks
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры, которые выводят шаблоны (includes/card.html и
+# posts/post_detail.html): они создаются сразу после сохранения поста.
+THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Сколько секунд держится блокировка генерации одной миниатюры.
+LOCK_TIMEOUT: int = 60
+
+_executor = None
+
+
+def _init_worker():
+    # Модуль загружается в процессе пула до django.setup(), поэтому
+    # модели здесь импортируются только внутри функций.
+    django.setup()
+
+
+def get_executor():
+    """Пул процессов для генерации миниатюр, создается при первом вызове.
+
+    Процессы запускаются через spawn: форк унаследовал бы открытые
+    соединения с базой."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def run_inline():
+    """Генерировать ли миниатюры в текущем процессе.
+
+    Процессы пула не видят базу SQLite в памяти (тесты), а при нуле
+    воркеров пул отключен."""
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        return True
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def generate(source, geometry, options):
+    """Создает миниатюру и записывает ее в key-value store sorl.
+
+    source — ImageFile sorl вместе с хранилищем картинки: от хранилища
+    зависит имя миниатюры."""
+    ThumbnailBackend().get_thumbnail(source, geometry, **options)
+
+
+def _lock_key(thumbnail):
+    return f'posts:thumbnail-lock:{thumbnail.key}'
+
+
+def bump_pages(name):
+    """Сбрасывает закешированные страницы с постами картинки name.
+
+    Пока миниатюры не было, страницы лент и поста закешировались
+    с оригиналом; после ее создания они должны перерисоваться."""
+    from .models import Post
+    from .page_cache import (GLOBAL_SCOPE, author_scope, bump, group_scope,
+                             post_scope)
+
+    scopes = {GLOBAL_SCOPE}
+    posts = Post.objects.filter(image=name).values_list('pk', 'author_id',
+                                                        'group_id')
+    for post_id, author_id, group_id in posts:
+        scopes.update((post_scope(post_id), author_scope(author_id)))
+        if group_id:
+            scopes.add(group_scope(group_id))
+    bump(*scopes)
+
+
+def _release(thumbnail):
+    cache.delete(_lock_key(thumbnail))
+    locks.release(_lock_key(thumbnail))
+
+
+def _finish(source, thumbnail, future=None):
+    _release(thumbnail)
+    # Промах по key-value store запоминается в кеше, его нужно сбросить,
+    # иначе готовая миниатюра не будет видна этому процессу.
+    default.kvstore.cache.delete(add_prefix(thumbnail.key))
+    if future is not None and future.exception() is not None:
+        logger.error('Миниатюра %s не создана', thumbnail.name,
+                     exc_info=future.exception())
+        return
+    bump_pages(source.name)
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не создает миниатюры в запросе.
+
+    Готовая миниатюра берется из key-value store. Недостающая ставится
+    в пул процессов, а до ее готовности тег thumbnail отдает оригинал;
+    когда миниатюра готова, страницы с ней сбрасывает bump_pages."""
+
+    def full_options(self, source, options):
+        """Параметры миниатюры с умолчаниями, как в get_thumbnail sorl."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """ImageFile миниатюры (еще не проверенной) и ее полные параметры."""
+        options = self.full_options(source, options)
+        thumbnail = ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        )
+        return thumbnail, options
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail, options = self.thumbnail_file(source, geometry_string,
+                                                 options)
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        self.schedule(source, thumbnail, geometry_string, options)
+        return default.kvstore.get(thumbnail) or source
+
+    def schedule(self, source, thumbnail, geometry_string, options):
+        """Ставит создание миниатюры в пул.
+
+        Блокировка в базе (posts.locks) не дает запросам и сохранениям
+        в разных процессах и на разных серверах создавать одну и ту же
+        миниатюру несколько раз. Отметка в кеше процесса стоит перед ней,
+        чтобы страницы, которые ждут миниатюру, не писали в базу
+        на каждый запрос."""
+        key = _lock_key(thumbnail)
+        if not cache.add(key, 1, LOCK_TIMEOUT):
+            return
+        if not locks.acquire(key, LOCK_TIMEOUT):
+            return
+        if run_inline():
+            try:
+                generate(source, geometry_string, options)
+            except Exception:
+                _release(thumbnail)
+                raise
+            _finish(source, thumbnail)
+            return
+        future = get_executor().submit(generate, source, geometry_string,
+                                       options)
+        future.add_done_callback(
+            lambda done: _finish(source, thumbnail, done)
+        )
+
+
+def schedule(image):
+    """Ставит в пул все миниатюры из THUMBNAILS для картинки поста."""
+    for geometry, options in THUMBNAILS:
+        default.backend.get_thumbnail(image, geometry, **options)
+
+
+def _get_many(thumbnails):
+    """Готовые миниатюры из key-value store sorl по ключам thumbnail.key.
+
+    Кеш опрашивается одним get_many, а промахи дочитываются из таблицы
+    KVStore одним запросом и запоминаются в кеше."""
+    from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+    from sorl.thumbnail.models import KVStore
+
+    keys = {add_prefix(thumbnail.key): thumbnail.key
+            for thumbnail in thumbnails}
+    if not keys:
+        return {}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing).values_list(
+            'key', 'value'
+        ))
+        for key in missing:
+            values[key] = found.get(key, EMPTY_VALUE)
+        kv_cache.set_many({key: values[key] for key in missing},
+                          sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value and value != EMPTY_VALUE
+    }
+
+
+def prefetch_thumbnails(page_obj, geometry, options):
+    """Раздает постам страницы готовые миниатюры в post.thumbnail.
+
+    Миниатюры всей страницы ищутся в key-value store разом, так что
+    шаблон не обращается к хранилищу по каждому посту. Если миниатюры
+    еще нет, она ставится в пул, а в thumbnail кладется оригинал.
+    Варианты картинок постов-моделей подгружаются одним запросом."""
+    from .models import Post
+
+    posts = list(page_obj)
+    storage = Post._meta.get_field('image').storage
+    backend = default.backend
+    wanted = []
+    for post in posts:
+        post.thumbnail = None
+        if post.image:
+            source = ImageFile(getattr(post.image, 'name', post.image),
+                               storage)
+            thumbnail, full = backend.thumbnail_file(source, geometry,
+                                                     options)
+            wanted.append((post, source, thumbnail, full))
+    ready = _get_many(thumbnail for _, _, thumbnail, _ in wanted)
+    for post, source, thumbnail, full in wanted:
+        post.thumbnail = ready.get(thumbnail.key)
+        if post.thumbnail is None:
+            backend.schedule(source, thumbnail, geometry, full)
+            post.thumbnail = source
+    prefetch_related_objects(
+        [post for post in posts if isinstance(post, Post)], 'variants'
+    )
@@ -0,0 +1,223 @@
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+# Сколько строк ленты вставляется за один INSERT.
+BATCH_SIZE: int = 1000
+# Сколько последних постов автора попадает в ленту при подписке
+# и пересборке: так далеко ленту не листают, а подписка на автора
+# с тысячами постов не должна вставлять их все.
+BACKFILL_LIMIT: int = 500
+
+
+def _bulk_insert(entries):
+    """Вставляет строки ленты пачками, пропуская уже существующие."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def follower_counts(author_ids):
+    """Число подписчиков для каждого автора по счетчикам UserStats."""
+    counts = dict.fromkeys(author_ids, 0)
+    counts.update(
+        UserStats.objects.filter(user_id__in=author_ids).values_list(
+            'user_id', 'followers_count'
+        )
+    )
+    return counts
+
+
+def is_pull(follower_count):
+    """Посты авторов с таким числом подписчиков читаются при просмотре."""
+    return follower_count > settings.TIMELINE_PULL_THRESHOLD
+
+
+def _mark_pulled(author_id):
+    """Отмечает, что посты автора перестали раскладываться по лентам."""
+    UserStats.objects.filter(
+        user_id=author_id, timeline_pulled=False
+    ).update(timeline_pulled=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты популярных авторов не раскладываются: их подмешивает
+    feed_sources при чтении ленты."""
+    if is_pull(follower_counts([post.author_id])[post.author_id]):
+        _mark_pulled(post.author_id)
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).distinct()
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def latest_posts(author_id):
+    """Последние BACKFILL_LIMIT постов автора: пары (id, pub_date)."""
+    return Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:BACKFILL_LIMIT]
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора."""
+    posts = latest_posts(author_id)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def drop(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow(user_id, author_id):
+    """Обновляет ленту после подписки."""
+    if is_pull(follower_counts([author_id])[author_id]):
+        _mark_pulled(author_id)
+    else:
+        backfill(user_id, author_id)
+
+
+def unfollow(user_id, author_id):
+    """Обновляет ленту после отписки.
+
+    Возвращает True, если автор больше не популярен, а его посты еще
+    не разложены по лентам: тогда нужна задача push_author. Число
+    подписчиков сравнивается с порогом, а не проверяется на равенство:
+    при одновременных отписках ни одна могла не увидеть ровно порог."""
+    drop(user_id, author_id)
+    return UserStats.objects.filter(
+        user_id=author_id, timeline_pulled=True,
+        followers_count__lte=settings.TIMELINE_PULL_THRESHOLD,
+    ).exists()
+
+
+def push_author(author_id):
+    """Раскладывает посты автора, переставшего быть популярным, по лентам
+    всех его подписчиков.
+
+    Метка timeline_pulled снимается в той же транзакции, поэтому
+    повторный запуск ничего не делает. Если автор успел снова стать
+    популярным, посты не раскладываются."""
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().filter(
+            user_id=author_id, timeline_pulled=True
+        ).first()
+        if stats is None or is_pull(stats.followers_count):
+            return
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True).distinct()
+        for follower_id in followers.iterator():
+            backfill(follower_id, author_id)
+        stats.timeline_pulled = False
+        stats.save(update_fields=['timeline_pulled'])
+
+
+def feed_sources(user):
+    """Ленты, из которых собирается страница /follow/ пользователя.
+
+    Разложенные посты читаются из TimelineEntry, а посты популярных
+    авторов — напрямую из Post. Источники сливаются
+    MergedCursorPaginator'ом."""
+    pushed = TimelineEntry.objects.select_related(
+        'post__author', 'post__group'
+    ).only(
+        'pub_date', 'post', *(f'post__{field}' for field in Post.card_fields)
+    ).filter(user=user)
+    authors = Follow.objects.filter(user=user).values_list(
+        'author_id', 'author__stats__followers_count'
+    )
+    pull_ids = [
+        author_id for author_id, count in authors if is_pull(count or 0)
+    ]
+    if not pull_ids:
+        return [(pushed, 'post')]
+    return [
+        (pushed.exclude(post__author_id__in=pull_ids), 'post'),
+        (Post.objects.cards().filter(author_id__in=pull_ids), None),
+    ]
+
+
+def _delete_stale(entries, pull_ids):
+    """Удаляет пачками строки лент без подписки и строки популярных
+    авторов: каждая пачка фиксируется отдельно."""
+    followed = Follow.objects.filter(user_id=OuterRef('user_id'),
+                                     author_id=OuterRef('post__author_id'))
+    stale = entries.annotate(followed=Exists(followed)).filter(
+        Q(followed=False) | Q(post__author_id__in=pull_ids)
+    ).values_list('pk', flat=True)
+    while True:
+        batch = list(stale[:BATCH_SIZE])
+        if not batch:
+            return
+        TimelineEntry.objects.filter(pk__in=batch).delete()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты из Post и Follow.
+
+    Без user_ids пересобираются ленты всех пользователей. Подписки
+    идут по авторам, чтобы посты каждого автора читались один раз.
+    Строки каждого автора вставляются в своей транзакции, а лишние
+    удаляются пачками: пересборка не держит блокировку записи все
+    время, а уже верные строки лент остаются на месте.
+    Возвращает число обработанных подписок."""
+    follows = Follow.objects.exclude(user=None).exclude(author=None)
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+    # Подзапрос, а не список: звезд может быть много, и их id
+    # не должны уходить в SQL параметрами.
+    pulled = UserStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_PULL_THRESHOLD
+    )
+    pull_ids = pulled.values('user_id')
+    pairs = follows.values_list('author_id', 'user_id').distinct()
+    processed = pairs.filter(author_id__in=pull_ids).count()
+    if user_ids is None:
+        pulled.update(timeline_pulled=True)
+        UserStats.objects.filter(
+            followers_count__lte=settings.TIMELINE_PULL_THRESHOLD
+        ).update(timeline_pulled=False)
+    _delete_stale(entries, pull_ids)
+    pushed = pairs.exclude(author_id__in=pull_ids).order_by('author_id')
+    author_ids = list(follows.exclude(author_id__in=pull_ids).values_list(
+        'author_id', flat=True
+    ).distinct().order_by('author_id'))
+    # Подписки читаются пачками авторов: курсор не остается открытым
+    # между транзакциями.
+    for start in range(0, len(author_ids), BATCH_SIZE):
+        chunk = author_ids[start:start + BATCH_SIZE]
+        for author_id, group in groupby(
+                list(pushed.filter(author_id__in=chunk)), key=itemgetter(0)):
+            followers = [user_id for _, user_id in group]
+            posts = list(latest_posts(author_id))
+            with transaction.atomic():
+                _bulk_insert(
+                    TimelineEntry(user_id=user_id, post_id=post_id,
+                                  pub_date=pub_date)
+                    for user_id in followers for post_id, pub_date in posts
+                )
+            processed += len(followers)
+    return processed
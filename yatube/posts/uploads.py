@@ -0,0 +1,178 @@
+import math
+import os
+from io import BytesIO
+
+from django import forms
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+# Больше этого размера файл отклоняется, не открываясь.
+MAX_UPLOAD_SIZE: int = 25 * 1024 * 1024
+# Больше этого числа пикселей картинка считается бомбой распаковки:
+# проверяется по заголовку, до декодирования.
+MAX_PIXELS: int = 50_000_000
+# Наибольшая сторона сохраненной картинки.
+MAX_DIMENSION: int = 2048
+# К этому размеру сжимаются сохраненные картинки: JPEG и WebP —
+# снижением качества по шагам, PNG — палитрой, а если этого мало,
+# картинка уменьшается в SHRINK_STEP раз, но не меньше MIN_DIMENSION.
+MAX_STORED_SIZE: int = 1024 * 1024
+QUALITY_STEPS = (85, 75, 65, 55)
+SHRINK_STEP: float = 0.75
+MIN_DIMENSION: int = 256
+# Что остается из image.info при сохранении: прозрачность нужна
+# для показа, остальное (EXIF, XMP, ICC, текст PNG, комментарии
+# GIF) — метаданные, которые Pillow иначе переписал бы в файл.
+KEPT_INFO = ('transparency',)
+
+# Форматы, которые сохраняются как есть (с перекодированием).
+FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+
+def _strip(image):
+    """Убирает из image.info все, кроме KEPT_INFO."""
+    image.info = {key: value for key, value in image.info.items()
+                  if key in KEPT_INFO}
+    return image
+
+
+def _encode(image, image_format, quality=None):
+    content = BytesIO()
+    options = {'optimize': True}
+    if quality is not None:
+        options['quality'] = quality
+    _strip(image).save(content, image_format, **options)
+    return content.getvalue()
+
+
+def _candidates(image, image_format):
+    """Варианты кодирования от лучшего к меньшему: (картинка, качество)."""
+    if image_format in ('JPEG', 'WEBP'):
+        return [(image, quality) for quality in QUALITY_STEPS]
+    if image_format == 'PNG' and image.mode != 'P':
+        if image.mode != 'RGB' or 'transparency' in image.info:
+            source = image.convert('RGBA')
+        else:
+            source = image
+        return [(image, None),
+                (source.quantize(256, method=Image.FASTOCTREE), None)]
+    return [(image, None)]
+
+
+def _shrink(image):
+    width, height = image.size
+    return image.resize((max(1, int(width * SHRINK_STEP)),
+                         max(1, int(height * SHRINK_STEP))), Image.LANCZOS)
+
+
+def _encode_bounded(image, image_format):
+    """Кодирует картинку, укладываясь в MAX_STORED_SIZE."""
+    while True:
+        for candidate, quality in _candidates(image, image_format):
+            content = _encode(candidate, image_format, quality)
+            if len(content) <= MAX_STORED_SIZE:
+                return content
+        if max(image.size) * SHRINK_STEP < MIN_DIMENSION:
+            return content
+        image = _shrink(image)
+
+
+def open_checked(upload):
+    """Открывает загрузку, проверив размер файла и число пикселей.
+
+    Image.open читает только заголовок, так что бомба распаковки
+    отклоняется до декодирования."""
+    if upload.size > MAX_UPLOAD_SIZE:
+        raise forms.ValidationError(
+            'Файл больше %(size)d МБ.',
+            params={'size': MAX_UPLOAD_SIZE // (1024 * 1024)},
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise forms.ValidationError('Не удалось прочитать картинку.')
+    width, height = image.size
+    # Кадры анимации декодируются все, поэтому считаются вместе.
+    if width * height * getattr(image, 'n_frames', 1) > MAX_PIXELS:
+        raise forms.ValidationError(
+            'Картинка больше %(pixels)d мегапикселей.',
+            params={'pixels': MAX_PIXELS // 1_000_000},
+        )
+    return image
+
+
+def _encode_animated(image, image_format, dimension):
+    """Кодирует анимацию GIF или WebP, уменьшив каждый кадр до dimension.
+
+    Длительности кадров и число повторов сохраняются, метаданные — нет."""
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((dimension, dimension), Image.LANCZOS)
+        frames.append(_strip(frame))
+    content = BytesIO()
+    options = {'quality': QUALITY_STEPS[0]} if image_format == 'WEBP' else {}
+    frames[0].save(content, image_format, save_all=True,
+                   append_images=frames[1:], duration=durations,
+                   loop=image.info.get('loop', 0), **options)
+    return content.getvalue()
+
+
+def _encode_animated_bounded(image, image_format):
+    """Кодирует анимацию, уменьшая кадры до MAX_STORED_SIZE."""
+    dimension = min(MAX_DIMENSION, max(image.size))
+    while True:
+        content = _encode_animated(image, image_format, dimension)
+        if (len(content) <= MAX_STORED_SIZE
+                or dimension * SHRINK_STEP < MIN_DIMENSION):
+            return content
+        dimension = int(dimension * SHRINK_STEP)
+
+
+def normalize_image(upload):
+    """Проверяет и перекодирует загруженную картинку поста.
+
+    Уменьшает картинку до MAX_DIMENSION по большей стороне, поворачивает
+    по EXIF и сохраняет заново без метаданных, не больше MAX_STORED_SIZE.
+    Имя и формат файла не меняются, неизвестные форматы становятся JPEG.
+    У анимаций GIF и WebP уменьшается каждый кадр. JPEG декодируется
+    сразу в уменьшенном масштабе (draft), поэтому память на загрузку
+    ограничена размером результата, а не оригинала."""
+    image = open_checked(upload)
+    source_format = image.format
+    image_format = source_format if source_format in FORMATS else 'JPEG'
+    animated = getattr(image, 'is_animated', False)
+    if animated and image_format in ('GIF', 'WEBP'):
+        try:
+            content = _encode_animated_bounded(image, image_format)
+        except (OSError, SyntaxError):
+            raise forms.ValidationError('Не удалось прочитать картинку.')
+        return SimpleUploadedFile(upload.name, content,
+                                  FORMATS[image_format])
+    width, height = image.size
+    scale = MAX_DIMENSION / max(width, height)
+    if image_format == 'JPEG' and scale < 1:
+        # Декодер JPEG сразу уменьшает картинку в 2, 4 или 8 раз,
+        # оставаясь не меньше итогового размера.
+        image.draft('RGB', (math.ceil(width * scale),
+                            math.ceil(height * scale)))
+    try:
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError):
+        raise forms.ValidationError('Не удалось прочитать картинку.')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    name = upload.name
+    if image_format != source_format:
+        name = os.path.splitext(name)[0] + '.jpg'
+    return SimpleUploadedFile(name, _encode_bounded(image, image_format),
+                              FORMATS[image_format])
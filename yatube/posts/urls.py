@@ -10,6 +10,8 @@ urlpatterns = [
     path('group/<slug:slug>/',
          views.group_posts,
          name='group_list'),
+    # Поиск постов
+    path('search/', views.search, name='search'),
     # Просмотр профиля
     path('profile/<str:username>/',
          views.profile,
@@ -26,6 +28,10 @@ urlpatterns = [
     path('posts/<post_id>/edit/',
          views.post_edit,
          name='post_edit'),
+    # Следующие страницы комментариев
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     # Комментирование поста
     path('posts/<int:post_id>/comment/',
          views.add_comment,
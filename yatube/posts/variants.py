@@ -0,0 +1,177 @@
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from . import page_cache
+from .models import ImageVariant, Post
+from .thumbnails import LOCK_TIMEOUT, get_executor, run_inline
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов картинки: телефон, планшет, десктоп.
+VARIANT_WIDTHS = (320, 640, 960)
+# Пропорции карточки: варианты обрезаются по центру, как миниатюра 960x339.
+ASPECT_RATIO = 339 / 960
+# Формат, который понимают все браузеры: он идет в <img>.
+FALLBACK_FORMAT = 'jpeg'
+QUALITY: int = 80
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def available_formats():
+    """Форматы, которые умеет записывать установленный Pillow.
+
+    Современные форматы идут первыми: браузер берет первый
+    поддерживаемый <source>."""
+    formats = []
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    formats.append(FALLBACK_FORMAT)
+    return formats
+
+
+def encode(image, width, image_format):
+    """Обрезает картинку под карточку нужной ширины и кодирует ее."""
+    size = (width, round(width * ASPECT_RATIO))
+    variant = ImageOps.fit(image, size, Image.LANCZOS)
+    if image_format == FALLBACK_FORMAT and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    content = BytesIO()
+    variant.save(content, image_format.upper(), quality=QUALITY)
+    return size, content.getvalue()
+
+
+def _encode_variants(post):
+    """Несохраненные варианты картинки поста во всех форматах."""
+    with post.image.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+    created = []
+    for image_format in available_formats():
+        for width in VARIANT_WIDTHS:
+            (width, height), content = encode(image, width, image_format)
+            # Хеш в имени: браузеры и CDN не покажут прежний вариант.
+            digest = hashlib.sha1(content).hexdigest()[:10]
+            name = f'{post.pk}-{width}-{digest}.{image_format}'
+            created.append(ImageVariant(
+                post=post, width=width, height=height,
+                format=image_format, file=ContentFile(content, name)
+            ))
+    return created
+
+
+def _image_name(post_id, lock=False):
+    posts = Post.objects.filter(pk=post_id)
+    if lock:
+        posts = posts.select_for_update()
+    return posts.values_list('image', flat=True).first()
+
+
+def _replace(post, created):
+    """Заменяет варианты поста на created, если картинка та же.
+
+    Возвращает False, если картинку успели сменить."""
+    with transaction.atomic():
+        if _image_name(post.pk, lock=True) != post.image.name:
+            return False
+        for variant in post.variants.all():
+            variant.delete()
+        for variant in created:
+            variant.save()
+        post.save(update_fields=['modified'])
+    return True
+
+
+def generate_variants(post_id):
+    """Пересоздает варианты картинки поста.
+
+    Если картинку сменили, пока создавались варианты, они создаются
+    заново: иначе пост остался бы с вариантами прежней картинки, ведь
+    повторный schedule во время генерации ничего не ставит. После
+    записи вариантов у поста обновляется modified: закешированные
+    карточки перерисуются уже с <picture>, а страницы сбросит
+    bump_pages в процессе, который поставил задачу."""
+    while True:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is None:
+            return
+        created = []
+        if post.image:
+            try:
+                created = _encode_variants(post)
+            except (OSError, ValueError, SuspiciousOperation):
+                if _image_name(post_id) != post.image.name:
+                    continue
+                logger.exception('Картинка поста %s не читается', post.pk)
+                return
+        elif not post.variants.exists():
+            return
+        if _replace(post, created):
+            return
+
+
+def _lock_key(post_id):
+    return f'posts:variants-lock:{post_id}'
+
+
+def bump_pages(post_id):
+    """Сбрасывает закешированные страницы с постом post_id.
+
+    Кеш страниц у каждого процесса свой: post.save() в процессе пула
+    сбрасывает только его кеш, поэтому страницы сбрасывает процесс,
+    который поставил задачу, когда варианты готовы."""
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return
+    author_id, group_id = post
+    scopes = [page_cache.GLOBAL_SCOPE, page_cache.post_scope(post_id),
+              page_cache.author_scope(author_id)]
+    if group_id:
+        scopes.append(page_cache.group_scope(group_id))
+    page_cache.bump(*scopes)
+
+
+def _finish(post_id, future=None):
+    cache.delete(_lock_key(post_id))
+    if future is not None and future.exception() is not None:
+        logger.error('Варианты картинки поста %s не созданы', post_id,
+                     exc_info=future.exception())
+        return
+    bump_pages(post_id)
+
+
+def schedule(post):
+    """Ставит создание вариантов в пул после фиксации транзакции.
+
+    Блокировка не дает повторным сохранениям поста создавать варианты
+    одновременно; смену картинки во время генерации замечает сама
+    generate_variants."""
+    def submit():
+        if not cache.add(_lock_key(post.pk), 1, LOCK_TIMEOUT):
+            return
+        if run_inline():
+            try:
+                generate_variants(post.pk)
+            except Exception:
+                cache.delete(_lock_key(post.pk))
+                raise
+            _finish(post.pk)
+            return
+        future = get_executor().submit(generate_variants, post.pk)
+        future.add_done_callback(lambda done: _finish(post.pk, done))
+    transaction.on_commit(submit)
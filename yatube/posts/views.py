@@ -1,68 +1,144 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
 
 from .models import Post, Group, User, Follow
+from .conditional import conditional_page, remember_scopes
 from .forms import PostForm, CommentForm
+from .page_cache import (GLOBAL_SCOPE, PAGE_CACHE_TIMEOUT, author_scope,
+                         count_cache_key, group_scope, page_cache_key,
+                         post_scope)
+from .paginators import (CountingPaginator, CursorPaginator,
+                         MergedCursorPaginator)
+from .search import SearchPaginator
+from .thumbnails import THUMBNAILS, prefetch_thumbnails
+from .timeline import feed_sources
 
 LIMIT: int = 10
+COMMENTS_LIMIT: int = 20
 
 
+@conditional_page('index', [GLOBAL_SCOPE])
 def index(request):
-    """Создает главную страницу с пажинатором"""
+    """Создает главную страницу с пажинатором.
+
+    Лента берется из кеша страниц, пока не изменится глобальная версия."""
     context = {
-        'page_obj': create_pages(request,
-                                 Post.objects.select_related('author',
-                                                             'group').all()),
+        'page_obj': lazy_pages(request, Post.objects.cards(),
+                               count_key=count_cache_key(GLOBAL_SCOPE)),
+        'cache_timeout': PAGE_CACHE_TIMEOUT,
+        'page_cache_key': page_cache_key(request, 'index',
+                                         [GLOBAL_SCOPE]),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page('group_posts')
 def group_posts(request, slug):
     """Страница с постами конкретной группы."""
     group = get_object_or_404(Group, slug=slug)
+    remember_scopes('group_posts', [group_scope(group.pk)], slug)
     context = {
         'group': group,
-        'page_obj': create_pages(request,
-                                 group.posts.select_related('author').all())
+        'page_obj': lazy_pages(request,
+                               group.posts.cards(),
+                               total=group.posts_count),
+        'cache_timeout': PAGE_CACHE_TIMEOUT,
+        'page_cache_key': page_cache_key(request, 'group_posts',
+                                         [group_scope(group.pk)], slug),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page('profile')
 def profile(request, username):
     """Профиль пользователя."""
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    remember_scopes('profile', [author_scope(author.pk)], username)
+    stats = getattr(author, 'stats', None)
+    context = {
+        'author': author,
+        'page_obj': lazy_pages(
+            request, author.posts.cards(),
+            total=stats.posts_count if stats else None,
+            count_key=count_cache_key(author_scope(author.pk))
+        ),
+        'cache_timeout': PAGE_CACHE_TIMEOUT,
+        'page_cache_key': page_cache_key(request, 'profile',
+                                         [author_scope(author.pk)],
+                                         username),
+    }
     if request.user.is_authenticated:
-        context = {
-            'author': author,
-            'page_obj': create_pages(request,
-                                     author.posts.select_related('group',
-                                                                 ).all()),
-            'following': Follow.objects.filter(user=request.user,
-                                               author=author
-                                               ).exists()
-        }
-    else:
-        context = {
-            'author': author,
-            'page_obj': create_pages(request,
-                                     author.posts.select_related('group',
-                                                                 ).all())
-        }
+        context['following'] = Follow.objects.filter(user=request.user,
+                                                     author=author
+                                                     ).exists()
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    """Поиск постов по тексту с ранжированием по релевантности."""
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+    }
+    if query:
+        paginator = SearchPaginator(query, LIMIT)
+        context['page_obj'] = with_thumbnails(
+            paginator.get_cursor_page(request.GET)
+        )
+    return render(request, 'posts/search.html', context)
+
+
+@conditional_page('post_detail')
 def post_detail(request, post_id):
-    """Страница просмотра поста."""
-    post = get_object_or_404(Post, id=post_id)
+    """Страница просмотра поста.
+
+    Комментарии показываются первой страницей, остальные подгружаются
+    через post_comments."""
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        id=post_id
+    )
+    scopes = [post_scope(post.pk), author_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(group_scope(post.group_id))
+    remember_scopes('post_detail', scopes, post_id)
     context = {
         'post': post,
         'form': CommentForm(request.POST or None),
-        'comments': post.comments.select_related('author',).all()
+        'comments': create_comment_pages(request, post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев поста: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = create_comment_pages(request, post)
+    if request.GET.get('format') != 'json':
+        context = {
+            'post': post,
+            'comments': comments,
+        }
+        return render(request, 'posts/includes/comments.html', context)
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'pub_date': comment.pub_date.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next': comments.paginator.next_cursor,
+    })
+
+
 @login_required
 def post_create(request):
     """Cоздание поста."""
@@ -109,13 +185,13 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    """Страница с постами, на авторов которых подписан текущий пользователь"""
+    """Страница с постами, на авторов которых подписан текущий пользователь.
+
+    Посты читаются из материализованной ленты TimelineEntry, а посты
+    популярных авторов подмешиваются при чтении."""
+    paginator = MergedCursorPaginator(feed_sources(request.user), LIMIT)
     context = {
-        'page_obj': create_pages(
-            request,
-            Post.objects.select_related('author', 'group').filter(
-                author__following__user=request.user
-            ).all()),
+        'page_obj': with_thumbnails(paginator.get_cursor_page(request.GET)),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -126,7 +202,12 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user == author:
         return redirect('posts:profile', username=username)
-    Follow.objects.get_or_create(user=request.user, author=author)
+    try:
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
+    except IntegrityError:
+        # Подписку успел создать параллельный запрос: она уже есть.
+        pass
     return redirect('posts:profile', username=username)
 
 
@@ -140,9 +221,44 @@ def profile_unfollow(request, username):
     return redirect('posts:profile', username=username)
 
 
-def create_pages(request, post_list):
-    """Получение страниц с пажинатором."""
-    paginator = Paginator(post_list, LIMIT)
+def create_pages(request, post_list, total=None, count_key=None):
+    """Получение страниц с пажинатором.
+
+    В режиме POSTS_PAGINATION = 'cursor' страницы листаются по ключу
+    (pub_date, id) без COUNT(*) и OFFSET. Иначе число постов берется
+    из счетчика total или из кеша по count_key. В режиме
+    POSTS_READ_MODEL = 'rows' посты читаются строками PostRow.
+    Миниатюры страницы подгружаются разом, см. with_thumbnails."""
+    if settings.POSTS_READ_MODEL == 'rows':
+        post_list = post_list.rows()
+    if settings.POSTS_PAGINATION == 'cursor':
+        return with_thumbnails(
+            CursorPaginator(post_list, LIMIT).get_cursor_page(request.GET)
+        )
+    paginator = CountingPaginator(post_list, LIMIT, total=total,
+                                  count_key=count_key)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    return with_thumbnails(page_obj)
+
+
+def with_thumbnails(page_obj):
+    """Страница постов с миниатюрами карточек, найденными одним запросом."""
+    geometry, options = THUMBNAILS[0]
+    prefetch_thumbnails(page_obj, geometry, options)
     return page_obj
+
+
+def create_comment_pages(request, post):
+    """Страница комментариев поста по ключу (pub_date, id)."""
+    paginator = CursorPaginator(post.comments.select_related('author').all(),
+                                COMMENTS_LIMIT)
+    return paginator.get_cursor_page(request.GET)
+
+
+def lazy_pages(request, post_list, **kwargs):
+    """Страница, которая читается из базы только при обращении.
+
+    Если лента взята из кеша страниц, запрос к базе не выполняется."""
+    return SimpleLazyObject(lambda: create_pages(request, post_list,
+                                                 **kwargs))
@@ -0,0 +1,18 @@
+import django
+
+
+def run_jobs(stop, once, poll_interval):
+    """Точка входа процесса-воркера очереди posts.jobs.
+
+    Процесс запускается через spawn и загружает этот модуль до
+    django.setup(), поэтому jobs с его моделями импортируется после."""
+    django.setup()
+    from . import jobs
+    jobs.serve(stop, once, poll_interval)
+
+
+def init_seed(path):
+    """Инициализатор процессов seed_yatube: пишут в файл базы path."""
+    django.setup()
+    from . import seed
+    seed.use_database(path)
@@ -5,6 +5,7 @@ from django.contrib.auth.views import LogoutView, LoginView, \
 from django.urls import path
 
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -36,7 +37,8 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view(
-            template_name='password_reset_form.html'
+            template_name='password_reset_form.html',
+            form_class=QueuedPasswordResetForm
         )
     ),
     path(
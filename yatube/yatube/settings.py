@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +88,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Воркеры очереди пишут в базу параллельно с сайтом: ждать
+        # блокировку записи дольше стандартных 5 секунд.
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -142,8 +146,76 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Режим пажинации лент: 'pages' (номера страниц) или 'cursor' (по ключу
+# pub_date, id: глубокие страницы не читают пропущенные строки).
+POSTS_PAGINATION = 'pages'
+
+# Миниатюры создаются пулом процессов после сохранения поста; пока
+# миниатюра не готова, шаблоны показывают оригинал. При 0 воркеров
+# миниатюры создаются в процессе, который их запросил.
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Сколько процессов запускает run_workers для фоновой очереди
+# posts.jobs (письма, раскладка лент, дайджесты). Задачи выполняют
+# только воркеры: рядом с сервером должна работать команда
+# python manage.py run_workers, иначе задачи копятся в очереди.
+POSTS_JOB_WORKERS = 2
+
+# Подписчики получают одно письмо обо всех новых постах за это
+# число секунд; ссылки в письмах строятся от POSTS_SITE_URL.
+POSTS_DIGEST_WINDOW = 600
+POSTS_SITE_URL = 'http://localhost:8000'
+
+# Чем читать ленты: 'models' (модели Post) или 'rows' (легкие
+# объекты posts.read_models.PostRow).
+POSTS_READ_MODEL = 'models'
+
+# Авторы, у которых подписчиков больше порога, не раскладывают посты
+# по лентам подписчиков: их посты подмешиваются при чтении /follow/.
+TIMELINE_PULL_THRESHOLD = 10000
+
+# Поисковый движок по постам: наследник posts.search.SearchBackend.
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Замеры фаз запроса (SQL, сессия, шаблоны, миниатюры). Доля запросов
+# POSTS_PROFILING_SAMPLE_RATE и все запросы медленнее
+# POSTS_PROFILING_SLOW_MS пишутся в лог posts.profiling; заголовок
+# Server-Timing получают только запросы с адресов INTERNAL_IPS.
+# Выключенные замеры ничего не стоят.
+INTERNAL_IPS = ['127.0.0.1']
+POSTS_PROFILING = False
+POSTS_PROFILING_SAMPLE_RATE = 0.01
+POSTS_PROFILING_SLOW_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiling': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'profiling.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'posts.profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Тесты проверяют, что GET каждой страницы укладывается в постоянный
+# бюджет запросов posts.query_budget.BUDGETS. Рост числа запросов
+# с размером страницы раннер не ловит: это делает test_query_budget.
+TEST_RUNNER = 'posts.test_runner.QueryBudgetRunner'